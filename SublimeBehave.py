@@ -1,6 +1,9 @@
 import sublime
 from .lib_behave import *
 from .lib_behave.utils import get_project_root, is_feature_file_in_project
+from .lib_behave.behave_worker import stop_workers
+from .lib_behave.process_registry import running_processes
+from .lib_behave.update_registry_cmd import change_detector
 import sys
 
 def plugin_loaded():
@@ -9,10 +12,17 @@ def plugin_loaded():
     def initial_update():
         window = sublime.active_window()
         if get_project_root(window):
-            window.run_command('sb_update_all_step_definitions')
+            window.run_command('sb_update_all_step_definitions',
+                               {'use_cache': True})
 
             view = window.active_view()
             if is_feature_file_in_project(view):
                 view.run_command('sb_highlight_undefined_steps')
 
     sublime.set_timeout(initial_update, 200.0)
+    change_detector.start()
+
+def plugin_unloaded():
+    change_detector.stop()
+    running_processes.cancel()
+    stop_workers()
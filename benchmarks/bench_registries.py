@@ -0,0 +1,193 @@
+'''
+Measures how step registries scale with the size of a behave project.
+Runs outside of Sublime (sublime and sublime_plugin modules are stubbed)
+against a generated project, behave's output is generated too:
+
+    python benchmarks/bench_registries.py --definitions 10000 --usages 200000 \
+        --output results.json --compare previous.json
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, 'stubs'))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+import sublime
+from lib_behave.behave_command import BehaveCommand
+from lib_behave.navigate_step_cmd import SbListStepsCommand
+from lib_behave.project_registry import projects
+from lib_behave.timing import get_size
+from synthetic_project import SyntheticProject
+
+RESULTS_VERSION = 1
+
+class QuickPanelWindow:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def folders(self):
+        return [self.directory]
+
+    def active_view(self):
+        return None
+
+    def show_quick_panel(self, items, on_select):
+        self.items = items
+
+def measure(fun, args):
+    '''
+    Calls fun for every item of args, returns timing statistics
+    '''
+    timings = []
+    for arg in args:
+        start = time.perf_counter()
+        fun(arg)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'calls': len(timings),
+        'mean_us': sum(timings) / len(timings) * 1e6,
+        'p50_us': timings[len(timings) // 2] * 1e6,
+        'p95_us': timings[int(len(timings) * 0.95)] * 1e6,
+        'min_us': timings[0] * 1e6,
+    }
+
+def fake_behave_output(project):
+    outputs = {
+        'steps': project.steps_output(),
+        'steps.usage': project.steps_usage_output(),
+    }
+
+    def run_lines(self, cwd, *args, **kwargs):
+        return iter(outputs[args[list(args).index('-f') + 1]])
+    return run_lines
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=BENCHMARKS_DIR,
+                                       stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(directory, project, args):
+    rnd = random.Random(args.seed)
+    repeats = range(args.repeats)
+    results = {}
+    step_registry = projects.get(directory).step_registry
+    step_usages_registry = projects.get(directory).step_usages_registry
+
+    results['update_definitions'] = measure(
+        lambda _: step_registry._update_definitions(directory), repeats)
+    results['update_step_usages'] = measure(
+        lambda _: step_usages_registry._update_step_usages(directory),
+        repeats)
+
+    usages = [(x[0], x[1]) for x in project.usages]
+    results['get_step_definition'] = measure(
+        lambda x: step_usages_registry.get_step_definition(*x),
+        [rnd.choice(usages) for _ in range(args.lookups)])
+
+    definitions = [(x.file_name, x.line) for x in project.definitions]
+    results['get_step_references'] = measure(
+        lambda x: step_usages_registry.get_step_references(*x),
+        [rnd.choice(definitions) for _ in range(args.lookups)])
+
+    count = sum(1 for _ in step_registry)
+    results['get_definition_by_index'] = measure(
+        step_registry.get_definition_by_index,
+        [rnd.randrange(count) for _ in range(args.lookups)])
+
+    command = SbListStepsCommand(QuickPanelWindow(directory))
+    results['list_steps'] = measure(lambda _: command.run(), repeats)
+    return results
+
+def measure_memory(directory, project):
+    '''
+    Returns approximate memory taken by registries, per indexed item
+    '''
+    registries = projects.get(directory)
+    definitions_size = get_size(registries.step_registry)
+    # Step usages refer to step definitions
+    usages_size = get_size(registries) - definitions_size
+    return {
+        'bytes_per_definition': definitions_size / len(project.definitions),
+        'bytes_per_usage': usages_size / len(project.usages),
+    }
+
+def compare(results, previous):
+    print('\n{:26} {:>12} {:>12} {:>8}'.format('p50 vs previous', 'previous',
+                                                'current', 'ratio'))
+    for name, result in sorted(results.items()):
+        old = previous.get(name)
+        if old is None:
+            continue
+        print('{:26} {:10.1f}us {:10.1f}us {:7.2f}x'.format(
+            name, old['p50_us'], result['p50_us'],
+            result['p50_us'] / max(old['p50_us'], 1e-9)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--definitions', type=int, default=1000)
+    parser.add_argument('--usages', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    settings = sublime.load_settings('SublimeBehave.sublime-settings')
+    settings.set('behave_worker', False)
+
+    directory = tempfile.mkdtemp(prefix='sb-bench-')
+    try:
+        project = SyntheticProject(directory, args.definitions, args.usages,
+                                   args.seed)
+        project.write()
+        BehaveCommand.run_lines = fake_behave_output(project)
+        results = run_benchmarks(directory, project, args)
+        memory = measure_memory(directory, project)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print('{} definitions, {} usages'.format(args.definitions, args.usages))
+    for name, result in sorted(results.items()):
+        print('{:26} mean {mean_us:12.1f} us  p50 {p50_us:12.1f} us  '
+              'p95 {p95_us:12.1f} us'.format(name, **result))
+    print('{:26} {bytes_per_definition:10.1f} B per definition  '
+          '{bytes_per_usage:10.1f} B per usage'.format('memory', **memory))
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f)['results'])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': RESULTS_VERSION,
+                'commit': get_commit(),
+                'python': platform.python_version(),
+                'parameters': {
+                    'definitions': args.definitions,
+                    'usages': args.usages,
+                    'lookups': args.lookups,
+                    'repeats': args.repeats,
+                    'seed': args.seed,
+                },
+                'results': results,
+                'memory': memory,
+            }, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+'''
+Measures per-lookup latency of StepMatcher compared to a linear scan over
+all definitions. Runs outside of Sublime:
+
+    python benchmarks/bench_step_matcher.py --definitions 10000
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'lib_behave'))
+
+from step_matcher import StepMatcher, compile_pattern
+
+LEADING_WORDS = ['I', 'the', 'a', 'user', 'system', 'admin', 'page', 'we',
+                 'order', 'cart', 'customer', 'request', 'response', 'it']
+WORDS = ['has', 'is', 'opens', 'clicks', 'sees', 'item', 'items', 'button',
+         'with', 'without', 'named', 'total', 'price', 'status', 'code',
+         'account', 'logged', 'in', 'out', 'list', 'form', 'field', 'value']
+FIELDS = [('{name}', 'alice'), ('{count:d}', '42'), ('{price:f}', '1.5'),
+          ('"{text}"', '"some text"'), ('{word:w}', 'word')]
+
+class Definition:
+    def __init__(self, pattern, matcher):
+        self.pattern = pattern
+        self.matcher = matcher
+
+def make_definitions(count, rnd):
+    '''
+    Returns list of (definition, sample matching text)
+    '''
+    result = []
+    for index in range(count):
+        pattern = [rnd.choice(LEADING_WORDS)]
+        text = list(pattern)
+        for _ in range(rnd.randint(3, 7)):
+            if rnd.random() < 0.25:
+                field, value = rnd.choice(FIELDS)
+                pattern.append(field)
+                text.append(value)
+            else:
+                word = rnd.choice(WORDS)
+                pattern.append(word)
+                text.append(word)
+        # make every definition unique
+        pattern.append('#{}'.format(index))
+        text.append('#{}'.format(index))
+        if rnd.random() < 0.05:
+            # parameter in front, can't be bucketed
+            pattern.insert(0, '{who}')
+            text.insert(0, 'bob')
+        matcher = 'parse'
+        pattern = ' '.join(pattern)
+        if rnd.random() < 0.1:
+            matcher = 're'
+            pattern = pattern.replace('{count:d}', r'(\d+)') \
+                             .replace('{price:f}', r'([\d.]+)') \
+                             .replace('{word:w}', r'(\w+)') \
+                             .replace('"{text}"', r'"([^"]*)"') \
+                             .replace('{name}', '(.+)') \
+                             .replace('{who}', '(.+)') + '$'
+        result.append((Definition(pattern, matcher), ' '.join(text)))
+    return result
+
+def linear_match(definitions, text):
+    for step_def in definitions:
+        regex = compile_pattern(step_def.pattern, step_def.matcher)
+        if regex is not None and regex.match(text):
+            return step_def
+    return None
+
+def measure(fun, texts):
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        fun(text)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'mean_us': sum(timings) / len(timings) * 1e6,
+        'p50_us': timings[len(timings) // 2] * 1e6,
+        'p95_us': timings[int(len(timings) * 0.95)] * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--definitions', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    samples = make_definitions(args.definitions, rnd)
+    definitions = [x[0] for x in samples]
+    texts = [rnd.choice(samples)[1] for _ in range(args.lookups)]
+    misses = ['{} unknown step {}'.format(rnd.choice(LEADING_WORDS), x)
+              for x in range(args.lookups)]
+
+    start = time.perf_counter()
+    matcher = StepMatcher({'given': definitions})
+    build_time = time.perf_counter() - start
+
+    for text in texts[:100]:
+        assert matcher.match('given', text) is linear_match(definitions, text)
+
+    print('{} definitions, index built in {:.1f} ms'.format(
+        len(definitions), build_time * 1e3))
+    for name, texts in (('hit', texts), ('miss', misses)):
+        for impl, fun in (('linear', lambda x: linear_match(definitions, x)),
+                          ('indexed', lambda x: matcher.match('given', x))):
+            result = measure(fun, texts if impl == 'indexed' else texts[:200])
+            print('{:5} {:8} mean {mean_us:10.1f} us  p50 {p50_us:10.1f} us  '
+                  'p95 {p95_us:10.1f} us'.format(name, impl, **result))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+Minimal stand-in for Sublime Text's sublime module, just enough to import
+lib_behave and exercise it outside of the editor
+'''
+import tempfile
+
+ENCODED_POSITION = 1
+HOVER_TEXT = 1
+HIDE_ON_MOUSE_MOVE_AWAY = 2
+INHIBIT_WORD_COMPLETIONS = 8
+
+class Settings(dict):
+    def get(self, key, default=None):
+        return dict.get(self, key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+    def add_on_change(self, key, callback):
+        pass
+
+    def clear_on_change(self, key):
+        pass
+
+_settings = {}
+
+def load_settings(base_name):
+    return _settings.setdefault(base_name, Settings())
+
+class Region:
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+def status_message(message):
+    pass
+
+def platform():
+    return 'linux'
+
+def cache_path():
+    return tempfile.gettempdir()
+
+def set_timeout(callback, delay=0):
+    callback()
+
+def set_timeout_async(callback, delay=0):
+    callback()
+
+def windows():
+    return []
+
+def active_window():
+    return None
@@ -0,0 +1,14 @@
+'''
+Minimal stand-in for Sublime Text's sublime_plugin module
+'''
+
+class EventListener:
+    pass
+
+class WindowCommand:
+    def __init__(self, window):
+        self.window = window
+
+class TextCommand:
+    def __init__(self, view):
+        self.view = view
@@ -0,0 +1,184 @@
+'''
+Generates synthetic behave projects of given size, along with the output
+behave's 'steps' and 'steps.usage' formatters print for them
+'''
+import os
+import random
+
+STEP_TYPES = ['given', 'when', 'then']
+LEADING_WORDS = ['I', 'the', 'a', 'user', 'system', 'admin', 'page', 'we',
+                 'order', 'cart', 'customer', 'request', 'response', 'it']
+WORDS = ['has', 'is', 'opens', 'clicks', 'sees', 'item', 'items', 'button',
+         'with', 'without', 'named', 'total', 'price', 'status', 'code',
+         'account', 'logged', 'in', 'out', 'list', 'form', 'field', 'value']
+FIELDS = [('{name}', 'alice'), ('{count:d}', '42'), ('"{text}"', '"abc"')]
+
+DEFINITIONS_PER_FILE = 200
+STEPS_PER_SCENARIO = 10
+SCENARIOS_PER_FILE = 20
+UNDEFINED_RATIO = 0.05
+
+class SyntheticDefinition:
+    def __init__(self, step_type, pattern, sample, file_name, line):
+        self.step_type = step_type
+        self.pattern = pattern
+        # text matching the pattern
+        self.sample = sample
+        self.file_name = file_name
+        self.line = line
+
+    @property
+    def keyword(self):
+        return 'Given' if self.step_type == 'step' \
+            else self.step_type.capitalize()
+
+class SyntheticProject:
+    def __init__(self, directory, definitions, usages, seed=0):
+        self.directory = directory
+        self.rnd = random.Random(seed)
+        self.definitions = []
+        # (feature file, line, definition or None if undefined, text)
+        self.usages = []
+        self._make_definitions(definitions)
+        self._make_usages(usages)
+
+    def _make_definitions(self, count):
+        for index in range(count):
+            file_name = 'features/steps/steps_{}.py'.format(
+                index // DEFINITIONS_PER_FILE)
+            # Imports at the top, then 4 lines per definition
+            line = 3 + (index % DEFINITIONS_PER_FILE) * 4
+            step_type = 'step' if self.rnd.random() < 0.05 \
+                else self.rnd.choice(STEP_TYPES)
+            pattern = [self.rnd.choice(LEADING_WORDS)]
+            sample = list(pattern)
+            for _ in range(self.rnd.randint(3, 7)):
+                if self.rnd.random() < 0.2:
+                    field, value = self.rnd.choice(FIELDS)
+                    pattern.append(field)
+                    sample.append(value)
+                else:
+                    word = self.rnd.choice(WORDS)
+                    pattern.append(word)
+                    sample.append(word)
+            # make every definition unique
+            pattern.append('n{}'.format(index))
+            sample.append('n{}'.format(index))
+            self.definitions.append(SyntheticDefinition(
+                step_type, ' '.join(pattern), ' '.join(sample), file_name,
+                line))
+
+    def _make_usages(self, count):
+        steps_per_file = STEPS_PER_SCENARIO * SCENARIOS_PER_FILE
+        for index in range(count):
+            file_name = 'features/feature_{}.feature'.format(
+                index // steps_per_file)
+            in_file = index % steps_per_file
+            # 'Feature:' line, then blank line and 'Scenario:' line before
+            # steps of every scenario
+            line = 4 + in_file + 2 * (in_file // STEPS_PER_SCENARIO)
+            if self.rnd.random() < UNDEFINED_RATIO:
+                self.usages.append((file_name, line, None,
+                                    'Given undefined step {}'.format(index)))
+            else:
+                step_def = self.rnd.choice(self.definitions)
+                self.usages.append((file_name, line, step_def, '{} {}'.format(
+                    step_def.keyword, step_def.sample)))
+
+    def write(self):
+        '''
+        Writes step modules and feature files to the project directory
+        '''
+        by_file = {}
+        for step_def in self.definitions:
+            by_file.setdefault(step_def.file_name, []).append(step_def)
+        for file_name, step_defs in by_file.items():
+            lines = ['from behave import given, when, then, step', '']
+            for step_def in step_defs:
+                lines += ["@{}('{}')".format(step_def.step_type,
+                                            step_def.pattern),
+                          'def step_impl(context):',
+                          '    pass',
+                          '']
+            self._write_file(file_name, lines)
+
+        by_file = {}
+        for file_name, _, _, text in self.usages:
+            by_file.setdefault(file_name, []).append(text)
+        for file_name, steps in by_file.items():
+            lines = ['Feature: {}'.format(file_name)]
+            for index, text in enumerate(steps):
+                if index % STEPS_PER_SCENARIO == 0:
+                    lines += ['', '  Scenario: {}'.format(
+                        index // STEPS_PER_SCENARIO)]
+                lines.append('    ' + text)
+            self._write_file(file_name, lines)
+
+    def _write_file(self, file_name, lines):
+        path = os.path.join(self.directory, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def steps_output(self):
+        '''
+        Lines printed by 'behave --dry-run -f steps'
+        '''
+        lines = []
+        generic_defs = [x for x in self.definitions if x.step_type == 'step']
+        for step_type in STEP_TYPES + ['step']:
+            if step_type == 'step':
+                header, keyword, step_defs = 'GENERIC', '*', generic_defs
+            else:
+                header, keyword = step_type.upper(), step_type.capitalize()
+                step_defs = [x for x in self.definitions
+                             if x.step_type == step_type] + generic_defs
+            lines.append('{} STEP DEFINITIONS[{}]:'.format(header,
+                                                           len(step_defs)))
+            for step_def in step_defs:
+                lines.append('  {:40}  # {}:{}'.format(
+                    '{} {}'.format(keyword, step_def.pattern),
+                    step_def.file_name, step_def.line))
+            lines.append('')
+        return lines
+
+    def steps_usage_output(self):
+        '''
+        Lines printed by 'behave --dry-run -f steps.usage'
+        '''
+        lines = []
+        by_definition = {}
+        undefined = []
+        for file_name, line, step_def, text in self.usages:
+            if step_def is None:
+                undefined.append((file_name, line, text))
+            else:
+                by_definition.setdefault(id(step_def), []).append(
+                    (file_name, line, text))
+
+        unused = []
+        for step_def in self.definitions:
+            usages = by_definition.get(id(step_def))
+            if usages is None:
+                unused.append(step_def)
+                continue
+            lines.append("{:40}  # {}:{}".format(
+                "@{}('{}')".format(step_def.step_type, step_def.pattern),
+                step_def.file_name, step_def.line))
+            for file_name, line, text in usages:
+                lines.append('  {:38}  # {}:{}'.format(text, file_name, line))
+            lines.append('')
+
+        if unused:
+            lines.append('UNUSED STEP DEFINITIONS[{}]:'.format(len(unused)))
+            for step_def in unused:
+                lines.append("  {:38}  # {}:{}".format(
+                    "@{}('{}')".format(step_def.step_type, step_def.pattern),
+                    step_def.file_name, step_def.line))
+            lines.append('')
+        if undefined:
+            lines.append('UNDEFINED STEPS[{}]:'.format(len(undefined)))
+            for file_name, line, text in undefined:
+                lines.append('  {:38}  # {}:{}'.format(text, file_name, line))
+            lines.append('')
+        return lines
@@ -1,17 +1,30 @@
-﻿from .update_registry_cmd import SbUpdateAllStepDefinitionsCommand
-from .update_registry_cmd import SbUpdateStepUsagesCommand
-from .update_registry_cmd import SbHighlightUndefinedStepsCommand
-from .navigate_step_cmd import SbListStepsCommand
-from .navigate_step_cmd import SbGotoStepDefinitionCommand
-from .navigate_step_cmd import SbFindAllStepReferencesCommand
-from .navigate_step_cmd import SbGotoStepReferenceCommand
-from .insert_step_cmd import SbInsertNewStepCommand
-from .incorrect_conf_cmd import SbIncorrectConfigurationCommand
-from .run_behave_cmd import SbRunBehaveCommand
+﻿try:
+    import sublime_plugin
+except ImportError:
+    # Imported by the command line front end (see cli.py), there's no
+    # editor to register commands and event listeners with
+    sublime_plugin = None
 
-from .update_registry_cmd import SbStepRegistryEventListener
-from .auto_completion import SbAutoCompletionStepEventListener
-from .navigate_step_cmd import SbShowDefinitionEventListener
+if sublime_plugin is not None:
+    from .update_registry_cmd import SbUpdateAllStepDefinitionsCommand
+    from .update_registry_cmd import SbUpdateStepUsagesCommand
+    from .update_registry_cmd import SbHighlightUndefinedStepsCommand
+    from .navigate_step_cmd import SbListStepsCommand
+    from .navigate_step_cmd import SbGotoStepDefinitionCommand
+    from .navigate_step_cmd import SbFindAllStepReferencesCommand
+    from .navigate_step_cmd import SbGotoStepReferenceCommand
+    from .insert_step_cmd import SbInsertNewStepCommand
+    from .incorrect_conf_cmd import SbIncorrectConfigurationCommand
+    from .run_behave_cmd import SbRunBehaveCommand
+    from .run_behave_cmd import SbRerunFailedScenariosCommand
+    from .run_behave_cmd import SbShowSlowestScenariosCommand
+    from .run_behave_cmd import SbCancelBehaveCommand
+    from .run_affected_cmd import SbRunAffectedScenariosCommand
+    from .index_stats_cmd import SbShowIndexStatsCommand
+
+    from .update_registry_cmd import SbStepRegistryEventListener
+    from .auto_completion import SbAutoCompletionStepEventListener
+    from .navigate_step_cmd import SbShowDefinitionEventListener
 
 _all__ = [
     'SbUpdateAllStepDefinitionsCommand',
@@ -24,6 +37,11 @@ _all__ = [
     'SbInsertNewStepCommand',
     'SbIncorrectConfigurationCommand',
     'SbRunBehaveCommand',
+    'SbRerunFailedScenariosCommand',
+    'SbShowSlowestScenariosCommand',
+    'SbCancelBehaveCommand',
+    'SbRunAffectedScenariosCommand',
+    'SbShowIndexStatsCommand',
     'SbStepRegistryEventListener',
     'SbAutoCompletionStepEventListener',
     'SbShowDefinitionEventListener'
@@ -1,8 +1,55 @@
 import sublime
 import sublime_plugin
+import re
+
+from .insert_step_cmd import SbInsertNewStepCommand
+from .project_registry import projects
+from .utils import is_feature_file_in_project, get_view_root
 
 class SbAutoCompletionStepEventListener(sublime_plugin.EventListener):
-    pass
+    STEP_PATTERN = re.compile(r'^\s*(Given|When|Then|And|But|\*)\s+(.*)$')
+    MAX_COMPLETIONS = 100
+
+    def on_query_completions(self, view, prefix, locations):
+        if not is_feature_file_in_project(view):
+            return None
+
+        point = locations[0]
+        line = view.line(point)
+        match = self.STEP_PATTERN.match(view.substr(sublime.Region(line.a,
+                                                                   point)))
+        if not match:
+            return None
+
+        step_registry = projects.get(get_view_root(view)).step_registry
+        step_types = self._get_step_types(view, line, match.group(1),
+                                          step_registry)
+        text = match.group(2)
+        step_defs = step_registry.completion_index.complete(
+            step_types, text, self.MAX_COMPLETIONS)
+        if len(step_defs) == 0:
+            return None
+
+        # Completion replaces only the word being typed
+        start = len(text) - len(prefix)
+        completions = []
+        for step_def in step_defs:
+            rest = step_def.pattern[start:]
+            keyword = step_def.phrase.split(' ', 1)[0]
+            completions.append(['{}\t{}'.format(rest, keyword),
+                                SbInsertNewStepCommand._snippetize_step(rest)])
+        return (completions, sublime.INHIBIT_WORD_COMPLETIONS)
 
-#     # TODO
-#     # def on_query_completions(self, view, prefix, locations):
+    def _get_step_types(self, view, line, keyword, step_registry):
+        if keyword in ('Given', 'When', 'Then'):
+            return [keyword.lower()]
+        if keyword in ('And', 'But'):
+            # Same type as the closest preceding step
+            row = view.rowcol(line.a)[0]
+            while row > 0:
+                row -= 1
+                text = view.substr(view.line(view.text_point(row, 0)))
+                match = self.STEP_PATTERN.match(text)
+                if match and match.group(1) in ('Given', 'When', 'Then'):
+                    return [match.group(1).lower()]
+        return step_registry.order
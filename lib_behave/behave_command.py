@@ -1,43 +1,155 @@
 import re
+import time
 import subprocess
-import sublime
 import shutil
 
+from .behave_worker import get_worker, get_python_command, BehaveWorkerError
+from .host import load_settings, status_message
+from .process_registry import running_processes, start_process, \
+    kill_process, BehaveCancelledError
+from .timing import timed_phase, add_phase
+
 class BehaveCommand(object):
-    ERROR_PATTERN = re.compile('ParseError|ConfigError|FileNotFoundError|InvalidFileLocationError|InvalidFilenameError|Exception')
+    ERROR_PATTERN = re.compile('ParserError|ParseError|ConfigError|FileNotFoundError|InvalidFileLocationError|InvalidFilenameError|Exception')
 
     def run(self, cwd, *args, **kwargs):
-        command = tuple(self.behave_command) + \
-            tuple(arg for arg in args if arg)
+        args = tuple(arg for arg in args if arg)
+        use_worker = kwargs.pop('use_worker', True)
+        # Dry-runs don't execute any steps, so a resident process can
+        # answer them without starting behave from scratch
+        if use_worker and '--dry-run' in args and 'append_fun' not in kwargs:
+            out = self._run_worker(cwd, args)
+            if out is not None:
+                return out
+
+        command = tuple(self.behave_command) + args
         return self._launch_process(cwd, command, **kwargs)
 
-    def _launch_process(self, cwd, command, append_fun=None):
-        startupinfo = None
-        if sublime.platform() == 'windows':
-            # Prevent Windows from opening a console when starting a process
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    def run_lines(self, cwd, *args, **kwargs):
+        '''
+        Same as run but yields output lines (without line breaks) as soon as
+        behave prints them instead of collecting the whole output first
+        '''
+        args = tuple(arg for arg in args if arg)
+        if kwargs.get('use_worker', True) and '--dry-run' in args:
+            out = self._run_worker(cwd, args)
+            if out is not None:
+                yield from out.splitlines()
+                return
 
-        process = subprocess.Popen(command,
-                                   stdout=subprocess.PIPE,
-                                   universal_newlines=True,
-                                   cwd=cwd,
-                                   startupinfo=startupinfo)
+        command = tuple(self.behave_command) + args
+        with timed_phase('behave spawn'):
+            process = start_process(command, cwd,
+                                    stdout=subprocess.PIPE,
+                                    universal_newlines=True)
+        completed = False
+        with running_processes.track(process, cwd, '--dry-run' in args,
+                                     self._get_timeout(args)) as tracked:
+            try:
+                first_line = True
+                # Time spent waiting for behave, consumer's time is not
+                # counted
+                waited = 0
+                start = time.time()
+                for line in process.stdout:
+                    now = time.time()
+                    if first_line:
+                        # Loading behave and step modules, parsing features
+                        add_phase('behave startup', now - start)
+                        # Errors are reported at the very beginning of the
+                        # output
+                        if self.ERROR_PATTERN.match(line):
+                            self._check_output(line + process.stdout.read())
+                    else:
+                        waited += now - start
+                    first_line = False
+                    yield line.rstrip('\n')
+                    start = time.time()
+                waited += time.time() - start
+                process.wait()
+                add_phase('behave output', waited)
+                completed = True
+            finally:
+                process.stdout.close()
+                if not completed:
+                    # Consumer gave up or an error was raised
+                    kill_process(process)
+                    process.wait()
+        if tracked.reason:
+            raise BehaveCancelledError(tracked.reason)
 
-        if append_fun:
-            for line in process.stdout:
-                append_fun(line)
+    def _run_worker(self, cwd, args):
+        '''
+        Returns output of the dry-run made by the worker, None if it can't
+        be used
+        '''
+        worker = self._get_worker(cwd)
+        if worker is None:
+            return None
+        tracked = None
+        try:
+            with running_processes.track(worker.process, cwd, True,
+                                         self._get_timeout(args)) as tracked:
+                with timed_phase('behave worker'):
+                    out = worker.dry_run(args)
+        except BehaveWorkerError as e:
+            if tracked is not None and tracked.reason:
+                # Killed on purpose, running behave would start it all over
+                raise BehaveCancelledError(tracked.reason)
+            print('SublimeBehave: {}, running behave'.format(e))
+            return None
+        self._check_output(out)
+        return out
 
-        stdout, _ = process.communicate()
+    def _get_timeout(self, args):
+        if '--dry-run' not in args:
+            return None
+        settings = load_settings()
+        return settings.get('dry_run_timeout', 300)
 
+    def _get_worker(self, cwd):
+        settings = load_settings()
+        if not settings.get('behave_worker', False):
+            return None
+        python_cmd = settings.get('behave_worker_python', None)
+        if not python_cmd or not isinstance(python_cmd, list):
+            python_cmd = get_python_command(self.behave_command)
+        if not python_cmd:
+            return None
+        try:
+            return get_worker(cwd, python_cmd)
+        except BehaveWorkerError as e:
+            print('SublimeBehave: {}, running behave'.format(e))
+            return None
+
+    def _check_output(self, stdout):
         if self.ERROR_PATTERN.match(stdout):
             raise Exception("An error occurred while launching behave.\n",
                             stdout)
+
+    def _launch_process(self, cwd, command, append_fun=None):
+        with timed_phase('behave spawn'):
+            process = start_process(command, cwd,
+                                    stdout=subprocess.PIPE,
+                                    universal_newlines=True)
+
+        with running_processes.track(process, cwd, '--dry-run' in command,
+                                     self._get_timeout(command)) as tracked:
+            with timed_phase('behave run'):
+                if append_fun:
+                    for line in process.stdout:
+                        append_fun(line)
+
+                stdout, _ = process.communicate()
+
+        if tracked.reason:
+            raise BehaveCancelledError(tracked.reason)
+        self._check_output(stdout)
         return stdout
 
     @property
     def behave_command(self):
-        settings = sublime.load_settings('SublimeBehave.sublime-settings')
+        settings = load_settings()
         behave_cmd = settings.get('behave_command', None)
 
         if behave_cmd and isinstance(behave_cmd, list):
@@ -45,7 +157,7 @@ class BehaveCommand(object):
 
         behave_cmd = shutil.which('behave')
         if not behave_cmd:
-            sublime.status_message('behave could not be found. '
-                                   'Is it installed?')
+            status_message('behave could not be found. '
+                           'Is it installed?')
             raise Exception('behave could not be found. Is it installed?')
         return [behave_cmd]
@@ -0,0 +1,119 @@
+import os
+import re
+from configparser import ConfigParser, Error
+
+CONFIG_FILES = ('behave.ini', '.behaverc', 'setup.cfg', 'tox.ini')
+
+def read_configuration(directory):
+    '''
+    Returns options of [behave] section of configuration files, merged the
+    way behave does (project's ones override the user's). Relative paths
+    are made relative to the directory of their file
+    '''
+    config_dirs = [directory, os.path.expanduser('~')]
+    if os.name == 'nt' and 'APPDATA' in os.environ:
+        config_dirs.append(os.environ['APPDATA'])
+
+    result = {}
+    for config_dir in reversed(config_dirs):
+        for name in reversed(CONFIG_FILES):
+            path = os.path.join(config_dir, name)
+            if not os.path.isfile(path):
+                continue
+            config = ConfigParser()
+            config.optionxform = str
+            try:
+                config.read(path)
+                # Raw, logging_format and alike use % themselves
+                options = dict(config.items('behave', raw=True)) \
+                    if config.has_section('behave') else {}
+            except (Error, UnicodeDecodeError):
+                continue
+            if 'paths' in options:
+                options['paths'] = [
+                    os.path.normpath(os.path.join(config_dir, x.strip()))
+                    for x in options['paths'].splitlines() if x.strip()]
+            result.update(options)
+    return result
+
+def get_feature_files(directory):
+    '''
+    Returns sorted feature files (relative to the directory) behave runs
+    when no paths are given on its command line
+    '''
+    config = read_configuration(directory)
+    paths = config.get('paths') or [os.path.join(directory, 'features')]
+    include_re = _compile(config.get('include_re'))
+    exclude_re = _compile(config.get('exclude_re'))
+
+    result = set()
+    for path in paths:
+        path = os.path.join(directory, path)
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                result.update(os.path.join(dir_path, x) for x in file_names
+                              if x.endswith('.feature'))
+        elif path.endswith('.feature') and os.path.isfile(path):
+            result.add(path)
+
+    result = (os.path.relpath(x, directory) for x in result)
+    return sorted(x for x in result
+                  if (include_re is None or include_re.search(x)) and
+                  (exclude_re is None or not exclude_re.search(x)))
+
+def get_base_dir(directory, path=None, config=None):
+    '''
+    Returns directory behave loads steps and environment from when given
+    the path (relative to the directory, the first configured one by
+    default) first: the path's directory or its closest parent with a steps
+    directory (or environment file). None if there's none
+    '''
+    if config is None:
+        config = read_configuration(directory)
+    if path is None:
+        path = (config.get('paths') or ['features'])[0]
+    steps_dir = config.get('steps_dir') or 'steps'
+    environment_file = config.get('environment_file') or 'environment.py'
+    base_dir = os.path.abspath(os.path.join(directory, path))
+    if not os.path.isdir(base_dir):
+        base_dir = os.path.dirname(base_dir)
+    while True:
+        if os.path.isdir(os.path.join(base_dir, steps_dir)) or \
+                os.path.isfile(os.path.join(base_dir, environment_file)):
+            return base_dir
+        parent = os.path.dirname(base_dir)
+        if parent == base_dir:
+            return None
+        base_dir = parent
+
+def get_step_files(directory):
+    '''
+    Returns sorted Python files (relative to the directory) of behave's
+    base directory and everything under its steps directory, which may
+    change step definitions
+    '''
+    config = read_configuration(directory)
+    base_dir = get_base_dir(directory, config=config)
+    if base_dir is None:
+        return []
+    steps_dir = config.get('steps_dir') or 'steps'
+    try:
+        result = [os.path.join(base_dir, x) for x in os.listdir(base_dir)
+                  if x.endswith('.py')]
+    except OSError:
+        result = []
+    for dir_path, dir_names, file_names in os.walk(
+            os.path.join(base_dir, steps_dir)):
+        dir_names[:] = [x for x in dir_names
+                        if not x.startswith('.') and x != '__pycache__']
+        result.extend(os.path.join(dir_path, x) for x in file_names
+                      if x.endswith('.py'))
+    return sorted(os.path.relpath(x, directory) for x in result)
+
+def _compile(pattern):
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
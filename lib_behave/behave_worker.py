@@ -0,0 +1,152 @@
+import os
+import shutil
+import subprocess
+import threading
+
+from .behave_worker_server import read_message, write_message
+from .process_registry import start_process, kill_process
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'behave_worker_server.py')
+
+class BehaveWorkerError(Exception):
+    '''
+    Worker process is not usable, caller should fall back to running behave
+    '''
+    pass
+
+class BehaveWorker:
+    '''
+    Client of a resident behave process (see behave_worker_server.py) which
+    keeps behave and step modules loaded between dry-runs
+    '''
+    def __init__(self, directory, python_command):
+        self.directory = directory
+        self.python_command = python_command
+        self.process = None
+        self.lock = threading.Lock()
+        self.last_id = 0
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        if not os.path.isfile(SERVER_SCRIPT):
+            # i.e. installed as .sublime-package
+            raise BehaveWorkerError('Worker script is not available')
+        try:
+            self.process = start_process(
+                tuple(self.python_command) + ('-u', SERVER_SCRIPT),
+                self.directory,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE)
+        except OSError as e:
+            raise BehaveWorkerError('Could not start worker: {}'.format(e))
+        self.request('ping')
+
+    def stop(self):
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        try:
+            write_message(process.stdin, {'command': 'shutdown'})
+            process.wait(timeout=2)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            kill_process(process)
+
+    def request(self, command, **kwargs):
+        with self.lock:
+            if not self.is_running():
+                raise BehaveWorkerError('Worker is not running')
+            self.last_id += 1
+            message = dict(kwargs, id=self.last_id, command=command)
+            try:
+                write_message(self.process.stdin, message)
+                response = read_message(self.process.stdout)
+            except (OSError, ValueError):
+                response = None
+            if response is None or response.get('id') != self.last_id:
+                kill_process(self.process)
+                self.process = None
+                raise BehaveWorkerError('Worker died unexpectedly')
+            if response.get('restart'):
+                # Step modules can't be reloaded in it, it exits and the
+                # next request starts a new one
+                kill_process(self.process)
+                self.process = None
+                raise BehaveWorkerError('Worker must be restarted to reload '
+                                        'step modules')
+
+        if not response.get('ok'):
+            raise Exception("An error occurred while running behave worker.\n",
+                            response.get('error'))
+        return response.get('output', '')
+
+    def dry_run(self, args):
+        return self.request('dry_run', cwd=self.directory, args=list(args))
+
+def get_python_command(behave_command):
+    '''
+    Figures out the interpreter behave is installed for
+    '''
+    # python -m behave
+    for index, arg in enumerate(behave_command[:-1]):
+        if arg == '-m' and behave_command[index + 1] == 'behave':
+            return list(behave_command[:index])
+
+    behave_path = shutil.which(behave_command[0])
+    if not behave_path:
+        return None
+    # Virtual environments and regular installs keep the interpreter
+    # right next to the behave script (or one level up on Windows)
+    bin_dir = os.path.dirname(behave_path)
+    for path in (bin_dir, os.path.dirname(bin_dir)):
+        for name in ('python', 'python3', 'python.exe'):
+            python_path = os.path.join(path, name)
+            if os.path.isfile(python_path):
+                return [python_path]
+
+    try:
+        with open(behave_path, 'rb') as f:
+            first_line = f.readline().decode('utf-8', 'replace').strip()
+    except OSError:
+        return None
+    if first_line.startswith('#!'):
+        return first_line[2:].split()
+    return None
+
+_workers = {}
+# directory -> python command the worker failed to start with
+_failed_workers = {}
+_workers_lock = threading.Lock()
+
+def get_worker(directory, python_command):
+    '''
+    Returns running worker for the project, starting it if needed.
+    Raises BehaveWorkerError if it can't be started
+    '''
+    with _workers_lock:
+        if _failed_workers.get(directory) == python_command:
+            raise BehaveWorkerError('Worker failed to start before')
+        worker = _workers.get(directory)
+        if worker is not None and (not worker.is_running() or
+                                   worker.python_command != python_command):
+            worker.stop()
+            worker = None
+        if worker is None:
+            worker = BehaveWorker(directory, python_command)
+            try:
+                worker.start()
+            except Exception:
+                worker.stop()
+                _failed_workers[directory] = python_command
+                raise BehaveWorkerError('Worker failed to start')
+            _workers[directory] = worker
+        return worker
+
+def stop_workers():
+    with _workers_lock:
+        for worker in _workers.values():
+            worker.stop()
+        _workers.clear()
+        _failed_workers.clear()
@@ -0,0 +1,222 @@
+'''
+Resident behave process answering dry-run requests from SublimeBehave.
+
+Runs with project's Python interpreter (not Sublime's), so it must not import
+anything from the plugin. Every message, in both directions, is a 4-byte
+big-endian length followed by UTF-8 encoded JSON:
+
+    request:  {"id": 1, "command": "dry_run", "cwd": "...", "args": [...]}
+    response: {"id": 1, "ok": true, "output": "..."}
+              {"id": 1, "ok": false, "error": "..."}
+              {"id": 1, "ok": false, "restart": true}
+
+Step modules are loaded once. Afterwards the first one whose mtime changed
+and all executed after it are executed again, so definitions are registered
+in the same order as by a fresh behave. If that's not possible the worker
+answers with "restart" and exits.
+'''
+import io
+import json
+import os
+import struct
+import sys
+import traceback
+
+def read_message(stream):
+    header = _read_exactly(stream, 4)
+    if header is None:
+        return None
+    (length,) = struct.unpack('>I', header)
+    payload = _read_exactly(stream, length)
+    if payload is None:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+def write_message(stream, message):
+    payload = json.dumps(message).encode('utf-8')
+    stream.write(struct.pack('>I', len(payload)) + payload)
+    stream.flush()
+
+def _read_exactly(stream, size):
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+class RestartRequired(Exception):
+    '''
+    Step definitions can't be reloaded in this process
+    '''
+    pass
+
+def get_step_modules(step_paths):
+    '''
+    Returns step modules in the order behave executes them
+    '''
+    result = []
+    for path in step_paths:
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            continue
+        result.extend(os.path.abspath(os.path.join(path, x))
+                      for x in names if x.endswith('.py'))
+    return result
+
+def get_step_mtimes(step_paths):
+    result = {}
+    for file_name in get_step_modules(step_paths):
+        try:
+            result[file_name] = os.stat(file_name).st_mtime
+        except OSError:
+            pass
+    return result
+
+def make_runner_class():
+    from behave.runner import Runner
+    from behave.step_registry import registry
+
+    class CachingRunner(Runner):
+        '''
+        Keeps step definitions registered across runs and reloads only
+        modified step modules (and the ones executed after them)
+        '''
+        step_mtimes = None
+        # Modules imported by step modules are cached once loaded, loading
+        # everything again wouldn't register what they define
+        loaded = False
+
+        def load_step_definitions(self, extra_step_paths=None):
+            steps_dir = os.path.join(self.base_dir, self.config.steps_dir)
+            step_paths = [steps_dir] + list(extra_step_paths or [])
+            mtimes = get_step_mtimes(step_paths)
+            previous = CachingRunner.step_mtimes
+            # Start from scratch next time if anything goes wrong
+            CachingRunner.step_mtimes = None
+
+            if previous is None:
+                if CachingRunner.loaded:
+                    # Failed to reload before
+                    raise RestartRequired()
+                CachingRunner.loaded = True
+                super(CachingRunner, self).load_step_definitions(
+                    extra_step_paths)
+            else:
+                changed = [x for x, mtime in mtimes.items()
+                           if previous.get(x) != mtime]
+                removed = [x for x in previous if x not in mtimes]
+                if changed or removed:
+                    try:
+                        self._reload(step_paths, changed, removed)
+                    except ImportError:
+                        # Internals of this behave version are not what
+                        # we expect
+                        raise RestartRequired()
+            CachingRunner.step_mtimes = mtimes
+
+        def _reload(self, step_paths, changed, removed):
+            from behave import matchers
+            from behave.step_registry import setup_step_decorators
+            try:
+                from behave.runner_util import exec_file, PathManager
+            except ImportError:
+                from behave.runner import exec_file, PathManager
+
+            modules = get_step_modules(step_paths)
+            # Definitions are matched (and checked for being ambiguous) in
+            # the order they were registered, so everything executed after
+            # a changed module is executed again too
+            first = min([modules.index(x) for x in changed if x in modules] or
+                        [len(modules)])
+            stale = set(modules[first:]).union(removed)
+            known = stale.union(modules)
+            for step_defs in registry.steps.values():
+                for step_def in step_defs:
+                    if os.path.abspath(step_def.location.filename) \
+                            not in known:
+                        # Registered by a module imported by a step module,
+                        # it wouldn't be imported again
+                        raise RestartRequired()
+            for step_defs in registry.steps.values():
+                step_defs[:] = [
+                    x for x in step_defs
+                    if os.path.abspath(x.location.filename) not in stale]
+
+            step_globals = {
+                'use_step_matcher': matchers.use_step_matcher,
+                'step_matcher': matchers.step_matcher,
+            }
+            setup_step_decorators(step_globals)
+            with PathManager(step_paths):
+                default_matcher = matchers.current_matcher
+                for file_name in modules[first:]:
+                    exec_file(file_name, step_globals.copy())
+                    matchers.current_matcher = default_matcher
+
+    return CachingRunner
+
+def dry_run(runner_class, cwd, args):
+    from behave.configuration import Configuration
+    try:
+        from behave.__main__ import run_behave
+    except ImportError:
+        run_behave = None
+
+    os.chdir(cwd)
+    output = io.StringIO()
+    stdout = sys.stdout
+    # Formatters write to sys.stdout captured at Configuration creation
+    sys.stdout = output
+    try:
+        config = Configuration(command_args=list(args))
+        if run_behave is not None:
+            run_behave(config, runner_class=runner_class)
+        else:
+            if not config.format:
+                config.format = [config.default_format]
+            runner_class(config).run()
+    finally:
+        sys.stdout = stdout
+    return output.getvalue()
+
+def main():
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    # Anything printed by step modules must not end up in the protocol stream
+    sys.stdout = sys.stderr
+
+    runner_class = make_runner_class()
+    while True:
+        request = read_message(stdin)
+        if request is None or request.get('command') == 'shutdown':
+            break
+        response = {'id': request.get('id')}
+        try:
+            if request.get('command') == 'ping':
+                response['output'] = ''
+            elif request.get('command') == 'dry_run':
+                response['output'] = dry_run(runner_class, request['cwd'],
+                                             request['args'])
+            else:
+                raise ValueError('Unknown command: {}'.format(
+                    request.get('command')))
+            response['ok'] = True
+        except RestartRequired:
+            # Client starts a new worker
+            response['ok'] = False
+            response['restart'] = True
+            write_message(stdout, response)
+            break
+        except SystemExit as e:
+            response['ok'] = False
+            response['error'] = 'behave exited with {}'.format(e.code)
+        except Exception:
+            response['ok'] = False
+            response['error'] = traceback.format_exc()
+        write_message(stdout, response)
+
+if __name__ == '__main__':
+    main()
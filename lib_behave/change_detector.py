@@ -0,0 +1,117 @@
+import sublime
+import threading
+
+from .index_cache import IndexCache
+
+class ChangeDetector:
+    '''
+    Polls mtimes of feature files and step modules of indexed projects to
+    pick up changes made outside of the editor (checkouts, rebases,
+    generated code). Changes are reported once a poll finds no new ones, so
+    a branch switch is reported as a single batch
+    '''
+    EXTENSIONS = ('.feature', '.py')
+
+    def __init__(self, get_roots, is_busy, on_changes):
+        # Returns roots of projects to watch
+        self.get_roots = get_roots
+        # Tells if index of the root is being updated, changes are reported
+        # after that as the update may cover them already
+        self.is_busy = is_busy
+        # Called with (root, changed or added, removed) file names
+        self.on_changes = on_changes
+        self.lock = threading.Lock()
+        # root -> fingerprint the index is up to date with
+        self.fingerprints = {}
+        # root -> (changed, removed) detected, but not reported yet
+        self.pending = {}
+        self.generation = 0
+
+    def start(self):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self._schedule(generation)
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+
+    def set_fingerprint(self, root, fingerprint):
+        '''
+        Called once the whole project is indexed
+        '''
+        with self.lock:
+            self.fingerprints[root] = fingerprint
+            self.pending.pop(root, None)
+
+    def update_files(self, root, file_names):
+        '''
+        Called once given files are indexed
+        '''
+        update = IndexCache.fingerprint_files(root, file_names)
+        with self.lock:
+            fingerprint = self.fingerprints.get(root)
+            if fingerprint is None:
+                return
+            if root in self.pending:
+                for changes in self.pending[root]:
+                    changes.difference_update(file_names)
+            for file_name in file_names:
+                if file_name in update:
+                    fingerprint[file_name] = update[file_name]
+                else:
+                    fingerprint.pop(file_name, None)
+
+    def _schedule(self, generation):
+        settings = sublime.load_settings('SublimeBehave.sublime-settings')
+        interval = settings.get('change_detection_interval', 2)
+        if interval <= 0:
+            # Check again later in case it gets enabled
+            interval = 10
+        sublime.set_timeout_async(lambda: self._poll(generation),
+                                  int(interval * 1000))
+
+    def _poll(self, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+        settings = sublime.load_settings('SublimeBehave.sublime-settings')
+        if settings.get('change_detection_interval', 2) > 0:
+            roots = set(self.get_roots())
+            with self.lock:
+                for root in set(self.fingerprints) - roots:
+                    del self.fingerprints[root]
+                    self.pending.pop(root, None)
+            for root in roots:
+                self._poll_root(root)
+        self._schedule(generation)
+
+    def _poll_root(self, root):
+        with self.lock:
+            if root not in self.fingerprints:
+                return
+        new_fingerprint = IndexCache.fingerprint(root)
+        with self.lock:
+            old_fingerprint = self.fingerprints.get(root)
+            if old_fingerprint is None:
+                return
+            changed, removed = IndexCache.diff(old_fingerprint,
+                                               new_fingerprint)
+            changed = [x for x in changed if x.endswith(self.EXTENSIONS)]
+            removed = [x for x in removed if x.endswith(self.EXTENSIONS)]
+            if len(changed) > 0 or len(removed) > 0:
+                # Still changing, wait until it settles
+                self.fingerprints[root] = new_fingerprint
+                all_changed, all_removed = self.pending.setdefault(
+                    root, (set(), set()))
+                all_changed.difference_update(removed)
+                all_changed.update(changed)
+                all_removed.difference_update(changed)
+                all_removed.update(removed)
+                return
+            if root not in self.pending or self.is_busy(root):
+                return
+            all_changed, all_removed = self.pending.pop(root)
+        if len(all_changed) > 0 or len(all_removed) > 0:
+            self.on_changes(root, sorted(all_changed), sorted(all_removed))
@@ -0,0 +1,221 @@
+'''
+Command line front end to the step index, for CI and pre-commit checks.
+Run from the directory SublimeBehave is installed in:
+
+    python -m lib_behave [options] ROOT [QUERY ...]
+
+The index of ROOT (directory with features/) is built once, or loaded from
+the on-disk cache with --incremental, then all queries are answered in a
+single JSON document
+'''
+import os
+import re
+import sys
+import json
+import argparse
+from collections import OrderedDict
+
+from . import host
+from .behave_worker import stop_workers
+from .index_cache import IndexCache
+from .indexer import update_index, update_step_usages
+from .step_registry import StepRegistry, StepDefinition
+from .step_usages_registry import StepUsagesRegistry
+from .utils import get_cache_dir
+
+QUERY_HELP = '''queries (undefined and unused if none given):
+  undefined             step usages without a definition
+  unused                step definitions without usages
+  references:FILE:LINE  usages of the step definition at FILE:LINE
+  definition:FILE:LINE  definition of the step used at FILE:LINE
+  -                     read more queries from stdin, one per line
+
+exit status is 0 on success, 1 if --check failed and 2 on errors'''
+
+QUERIES = ('undefined', 'unused')
+LOCATION_QUERIES = ('references', 'definition')
+STEP_TYPE_NAMES = {v: k for k, v in StepDefinition.STEP_TYPE.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m lib_behave',
+        description='Answers queries about steps of a behave project.',
+        epilog=QUERY_HELP,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', metavar='ROOT',
+                        help='project directory (the one with features/)')
+    parser.add_argument('queries', metavar='QUERY', nargs='*')
+    parser.add_argument('--settings', metavar='FILE',
+                        help='SublimeBehave.sublime-settings to take '
+                             'settings (i.e. behave_command) from')
+    parser.add_argument('--incremental', action='store_true',
+                        help='load the index from the cache, re-index only '
+                             'files changed since and save it back')
+    parser.add_argument('--cache-dir', metavar='DIR', default=get_cache_dir(),
+                        help='where the index cache is kept '
+                             '(default: %(default)s)')
+    parser.add_argument('--check', action='store_true',
+                        help='fail if undefined or unused steps are found '
+                             'or a feature file fails to parse')
+    parser.add_argument('--verbose', action='store_true',
+                        help='report progress on stderr')
+    # Queries may follow options as well
+    args, extra = parser.parse_known_args(argv)
+    unknown = [x for x in extra if x.startswith('-') and x != '-']
+    if len(unknown) > 0:
+        parser.error('unrecognized arguments: ' + ' '.join(unknown))
+
+    queries = []
+    for query in args.queries + extra or QUERIES:
+        if query == '-':
+            queries.extend(x.strip() for x in sys.stdin if x.strip())
+        else:
+            queries.append(query)
+    try:
+        parsed = [parse_query(x) for x in queries]
+    except ValueError as e:
+        parser.error(str(e))
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(os.path.join(root, 'features')):
+        parser.error('{} has no features directory'.format(root))
+    if args.settings:
+        try:
+            host.headless_settings.update(load_settings_file(args.settings))
+        except (OSError, ValueError) as e:
+            parser.error('could not read {}: {}'.format(args.settings, e))
+    if args.verbose:
+        host.status_stream = sys.stderr
+
+    step_registry = StepRegistry()
+    step_usages_registry = StepUsagesRegistry(step_registry)
+    parse_errors = []
+
+    def on_parse_error(file_name, line_no):
+        parse_errors.append({'file': os.path.relpath(file_name, root),
+                             'line': line_no})
+
+    cache = IndexCache(args.cache_dir, root) if args.incremental else None
+    # Whatever the index core prints must not end up in the JSON output
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        update_index(root, step_registry, step_usages_registry, cache,
+                     update_usages=lambda file_names: update_step_usages(
+                         root, step_usages_registry, file_names,
+                         on_parse_error))
+    except Exception as e:
+        print('SublimeBehave: ' + '\n'.join(str(x) for x in e.args))
+        return 2
+    finally:
+        sys.stdout = stdout
+        stop_workers()
+
+    index = StepIndex(root, step_registry, step_usages_registry)
+    results = [{'query': query, 'result': index.query(*x)}
+               for query, x in zip(queries, parsed)]
+    json.dump({
+        'root': root,
+        'feature_files': len(step_usages_registry.step_usages),
+        'step_definitions': len(index.get_definitions()),
+        'parse_errors': parse_errors,
+        'results': results
+    }, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+    if args.check:
+        failed = any(len(x['result']) > 0 for x, (name, _, _)
+                     in zip(results, parsed) if name in QUERIES)
+        if failed or len(parse_errors) > 0:
+            return 1
+    return 0
+
+def parse_query(query):
+    '''
+    Returns (name, file name, line), the last two are None for queries
+    about the whole project. Raises ValueError if it's not a valid query
+    '''
+    if query in QUERIES:
+        return (query, None, None)
+    name, _, location = query.partition(':')
+    file_name, _, line = location.rpartition(':')
+    if name not in LOCATION_QUERIES or not file_name or not line.isdigit():
+        raise ValueError('invalid query: ' + query)
+    return (name, file_name, int(line))
+
+def load_settings_file(file_name):
+    '''
+    Reads .sublime-settings file, which is JSON with comments and trailing
+    commas allowed
+    '''
+    with open(file_name, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+    text = re.sub(r'^\s*//.*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r',(\s*[}\]])', r'\1', text)
+    return json.loads(text)
+
+class StepIndex:
+    '''
+    Answers queries about indexed steps of a project
+    '''
+    def __init__(self, root, step_registry, step_usages_registry):
+        self.root = root
+        self.step_registry = step_registry
+        self.step_usages_registry = step_usages_registry
+        # file name -> its lines, for step texts
+        self.lines = {}
+
+    def query(self, name, file_name=None, line=None):
+        if file_name is not None:
+            if os.path.isabs(file_name):
+                file_name = os.path.relpath(file_name, self.root)
+            file_name = os.path.normpath(file_name)
+        return getattr(self, 'get_' + name)(file_name, line)
+
+    def get_undefined(self, file_name, line):
+        result = []
+        for name in sorted(self.step_usages_registry.step_usages):
+            result.extend(self._get_step(x, y) for x, y in
+                          self.step_usages_registry.get_undefined_step_usages(
+                              name))
+        return result
+
+    def get_definitions(self):
+        '''
+        Returns definitions, one per location. @step is registered for
+        every step type, usages refer to the location anyway
+        '''
+        result = OrderedDict()
+        for step_def in self.step_registry:
+            result.setdefault((step_def.file_name, step_def.line), step_def)
+        return list(result.values())
+
+    def get_unused(self, file_name, line):
+        used = self.step_usages_registry.snapshot.usages_by_definition
+        return [{'type': STEP_TYPE_NAMES[x.step_type], 'phrase': x.phrase,
+                 'file': x.file_name, 'line': x.line}
+                for x in self.get_definitions()
+                if len(used.get((x.file_name, x.line), ())) == 0]
+
+    def get_references(self, file_name, line):
+        return [self._get_step(x, y) for x, y in sorted(
+            self.step_usages_registry.get_step_references(file_name, line))]
+
+    def get_definition(self, file_name, line):
+        location = self.step_usages_registry.get_step_definition(file_name,
+                                                                 line)
+        if location is None or location[1] == -1:
+            return None
+        return {'file': location[0], 'line': location[1]}
+
+    def _get_step(self, file_name, line):
+        lines = self.lines.get(file_name)
+        if lines is None:
+            try:
+                with open(os.path.join(self.root, file_name), 'r',
+                          encoding='utf-8-sig', errors='replace') as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                lines = []
+            self.lines[file_name] = lines
+        step = lines[line - 1].strip() if 0 < line <= len(lines) else None
+        return {'file': file_name, 'line': line, 'step': step}
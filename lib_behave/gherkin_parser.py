@@ -0,0 +1,158 @@
+import re
+
+class GherkinParseError(Exception):
+    '''
+    Message follows behave's ParserError so it can be handled the same way
+    '''
+    def __init__(self, file_name, message, line):
+        super(GherkinParseError, self).__init__(
+            'Failed to parse "{}": {}, at line {}'.format(file_name,
+                                                          message, line))
+        self.file_name = file_name
+        self.line = line
+
+class GherkinStep:
+    def __init__(self, step_type, text, line):
+        self.step_type = step_type
+        self.text = text
+        self.line = line
+        # Texts with <placeholders> replaced by each row of Examples
+        self.expanded_texts = []
+
+    def texts(self):
+        return self.expanded_texts if self.expanded_texts else [self.text]
+
+class GherkinParser:
+    '''
+    Minimal parser of (english) .feature files, only as much as needed
+    to collect steps along with their types and line numbers
+    '''
+    SECTION_PATTERN = re.compile(
+        r'^(Feature|Rule|Background|Scenario Outline|Scenario Template|'
+        r'Scenario|Examples|Scenarios):')
+    STEP_PATTERN = re.compile(r'^(Given|When|Then|And|But|\*)(?:\s+|$)(.*)$')
+    PLACEHOLDER_PATTERN = re.compile(r'<([^>]*)>')
+    OUTLINE_SECTIONS = ('Scenario Outline', 'Scenario Template')
+
+    class State:
+        feature = 1  # before the first scenario, description allowed
+        description = 2  # after scenario header, before the first step
+        steps = 3
+        examples = 4
+
+    def parse(self, file_name):
+        with open(file_name, 'r', encoding='utf-8-sig') as f:
+            return self.parse_lines(file_name, f)
+
+    def parse_lines(self, file_name, lines, strict=True):
+        '''
+        Returns list of GherkinStep for all steps in the file. Unless strict,
+        lines which are not valid at their position are skipped instead of
+        raising GherkinParseError
+        '''
+        steps = []
+        outline_steps = None
+        examples_header = None
+        docstring = None
+        last_type = None
+        state = self.State.feature
+
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if docstring is not None:
+                if line.startswith(docstring):
+                    docstring = None
+                continue
+            if not line or line.startswith('#') or line.startswith('@'):
+                continue
+
+            match = self.SECTION_PATTERN.match(line)
+            if match:
+                section = match.group(1)
+                if section in ('Examples', 'Scenarios'):
+                    if outline_steps is None:
+                        self._error(strict, file_name,
+                                    'Examples outside of Scenario Outline', line_no)
+                        continue
+                    examples_header = None
+                    state = self.State.examples
+                    continue
+                outline_steps = [] if section in self.OUTLINE_SECTIONS \
+                    else None
+                last_type = None
+                state = self.State.feature if section in ('Feature', 'Rule') \
+                    else self.State.description
+                continue
+
+            match = self.STEP_PATTERN.match(line)
+            if match:
+                if state == self.State.feature:
+                    self._error(strict, file_name,
+                                'Step outside of Scenario', line_no)
+                    continue
+                if state == self.State.examples:
+                    self._error(strict, file_name,
+                                'Step inside Examples', line_no)
+                    continue
+                keyword = match.group(1)
+                if keyword in ('And', 'But'):
+                    if last_type is None:
+                        self._error(strict, file_name,
+                                    'No previous step', line_no)
+                        continue
+                else:
+                    last_type = 'given' if keyword == '*' else keyword.lower()
+                step = GherkinStep(last_type, match.group(2).strip(), line_no)
+                steps.append(step)
+                if outline_steps is not None:
+                    outline_steps.append(step)
+                state = self.State.steps
+                continue
+
+            if line.startswith('"""') or line.startswith('```'):
+                if state != self.State.steps:
+                    self._error(strict, file_name,
+                                'Docstring outside of step', line_no)
+                    continue
+                docstring = line[:3]
+                continue
+
+            if line.startswith('|'):
+                if state == self.State.examples:
+                    cells = self._split_row(line)
+                    if examples_header is None:
+                        examples_header = cells
+                    else:
+                        self._expand_outline(outline_steps,
+                                             dict(zip(examples_header, cells)))
+                    continue
+                if state != self.State.steps:
+                    self._error(strict, file_name,
+                                'Table outside of step', line_no)
+                continue
+
+            # Free text is allowed only as a description
+            if state not in (self.State.feature, self.State.description):
+                self._error(strict, file_name,
+                            'Unexpected line "{}"'.format(line), line_no)
+
+        return steps
+
+    @staticmethod
+    def _error(strict, file_name, message, line_no):
+        if strict:
+            raise GherkinParseError(file_name, message, line_no)
+
+    @staticmethod
+    def _split_row(line):
+        cells = re.split(r'(?<!\\)\|', line.strip())[1:-1]
+        return [x.strip().replace('\\|', '|') for x in cells]
+
+    def _expand_outline(self, outline_steps, row):
+        def replace(match):
+            return row.get(match.group(1), match.group(0))
+
+        for step in outline_steps:
+            if '<' in step.text:
+                step.expanded_texts.append(
+                    self.PLACEHOLDER_PATTERN.sub(replace, step.text))
@@ -0,0 +1,56 @@
+import os
+
+try:
+    import sublime
+except ImportError:
+    # Running headless, i.e. the command line front end (see cli.py)
+    sublime = None
+
+SETTINGS_FILE = 'SublimeBehave.sublime-settings'
+
+class Settings:
+    '''
+    Settings of headless runs, same keys as SublimeBehave.sublime-settings
+    '''
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    def update(self, values):
+        self.values.update(values)
+
+headless_settings = Settings()
+# Where status messages of headless runs go, None drops them
+status_stream = None
+
+def is_headless():
+    return sublime is None
+
+def load_settings():
+    if sublime is None:
+        return headless_settings
+    return sublime.load_settings(SETTINGS_FILE)
+
+def status_message(message):
+    if sublime is not None:
+        sublime.status_message(message)
+    elif status_stream is not None:
+        print(message, file=status_stream)
+
+def is_windows():
+    if sublime is None:
+        return os.name == 'nt'
+    return sublime.platform() == 'windows'
+
+def cache_path():
+    if sublime is not None:
+        return sublime.cache_path()
+    if os.name == 'nt':
+        return os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    return os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
@@ -0,0 +1,136 @@
+import ast
+import os
+import hashlib
+import itertools
+
+from .gherkin_parser import GherkinParser
+
+SCENARIO_SECTIONS = ('Scenario', 'Scenario Outline', 'Scenario Template')
+
+class ImpactBaseline:
+    '''
+    Step definitions (a digest of their source) and step usages at some
+    point in time, to tell which scenarios are affected by changes made
+    since. Only what's needed for that is kept, not the registries'
+    snapshots which would double the index once it's rebuilt
+    '''
+    def __init__(self, root, step_registry, step_usages_registry):
+        self.sources = get_definition_sources(root, step_registry.step_defs)
+        # (def_file_name, def_line) -> [(file_name, line)], undefined steps
+        # are left out
+        self.usages = {}
+        snapshot = step_usages_registry.snapshot
+        for key, by_file in snapshot.usages_by_definition.items():
+            if key[1] != -1:
+                self.usages[key] = [(x.file_name, x.line)
+                                    for usages in by_file.values()
+                                    for x in usages]
+
+    def get_usages(self, file_name, line):
+        return self.usages.get((file_name, line), [])
+
+    def get_size(self):
+        '''
+        Number of step definitions and step usages kept
+        '''
+        return len(self.sources) + sum(len(x) for x in self.usages.values())
+
+def get_definition_sources(root, step_defs):
+    '''
+    Returns {(step_type, phrase): (file_name, line, digest)}. Digest covers
+    source of the decorated function and the rest of its module outside of
+    step definitions (i.e. helpers steps may call), it's None if the module
+    can't be parsed
+    '''
+    all_defs = list(itertools.chain.from_iterable(step_defs.values()))
+    lines_by_file = {}
+    for step_def in all_defs:
+        lines_by_file.setdefault(step_def.file_name, set()).add(step_def.line)
+    digests = {file_name: _get_digests(os.path.join(root, file_name), lines)
+               for file_name, lines in lines_by_file.items()}
+    return {(x.step_type, x.phrase): (x.file_name, x.line,
+                                      digests[x.file_name].get(x.line))
+            for x in all_defs}
+
+def _get_digests(path, def_lines):
+    '''
+    Splits step module into top-level statements, returns {line: digest}
+    for statements starting at def_lines (first decorator of a step)
+    '''
+    try:
+        with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+            source = f.read()
+        tree = ast.parse(source, path)
+    except (OSError, SyntaxError, ValueError):
+        return {}
+
+    lines = source.splitlines()
+    starts = sorted(min([x.lineno] + [y.lineno for y in
+                                      getattr(x, 'decorator_list', [])])
+                    for x in tree.body)
+    blocks = {}
+    rest = []
+    for index, start in enumerate(starts):
+        end = starts[index + 1] - 1 if index + 1 < len(starts) else len(lines)
+        text = '\n'.join(lines[start - 1:end]).rstrip()
+        if start in def_lines:
+            blocks[start] = text
+        else:
+            rest.append(text)
+    rest = '\n'.join(rest)
+    return {line: hashlib.sha1((rest + '\0' + text).encode('utf-8')).hexdigest()
+            for line, text in blocks.items()}
+
+def get_affected_locations(old, new):
+    '''
+    Returns set of (feature file, line) of step usages of definitions added,
+    changed or removed between two baselines
+    '''
+    locations = set()
+    for key, (file_name, line, digest) in new.sources.items():
+        source = old.sources.get(key)
+        if source is None or source[2] != digest or digest is None:
+            locations.update(new.get_usages(file_name, line))
+    for key, (file_name, line, digest) in old.sources.items():
+        source = new.sources.get(key)
+        if source is None or source[2] != digest or digest is None:
+            # Usages are gone (undefined now) or refer to the new location
+            locations.update(old.get_usages(file_name, line))
+    return locations
+
+def get_scenario_locations(root, locations):
+    '''
+    Turns step locations into 'file:line' locations of their scenarios.
+    Steps outside of scenarios (i.e. in Background) select the whole file
+    '''
+    lines_by_file = {}
+    for file_name, line in locations:
+        lines_by_file.setdefault(file_name, set()).add(line)
+
+    result = []
+    for file_name, step_lines in sorted(lines_by_file.items()):
+        try:
+            with open(os.path.join(root, file_name), 'r',
+                      encoding='utf-8-sig', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            # Removed meanwhile
+            continue
+        scenario_lines = set(_get_scenario_line(lines, x) for x in step_lines)
+        if None in scenario_lines:
+            result.append(file_name)
+        else:
+            result.extend('{}:{}'.format(file_name, x)
+                          for x in sorted(scenario_lines))
+    return result
+
+def _get_scenario_line(lines, line_no):
+    for index in range(min(line_no, len(lines)) - 1, -1, -1):
+        match = GherkinParser.SECTION_PATTERN.match(lines[index].strip())
+        if not match:
+            continue
+        if match.group(1) in SCENARIO_SECTIONS:
+            return index + 1
+        if match.group(1) not in ('Examples', 'Scenarios'):
+            return None
+    return None
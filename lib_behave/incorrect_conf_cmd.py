@@ -7,7 +7,7 @@ class SbIncorrectConfigurationCommand(sublime_plugin.WindowCommand):
 
     def run(self):
         self.window.show_quick_panel(
-            ["Please open your project's Behave root directory and set it as a first folder on the list"],
+            ["Please open your project's Behave root directory as a folder"],
             None)
 
     def is_enabled(self):
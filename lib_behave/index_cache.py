@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+
+from .behave_config import get_feature_files, get_step_files
+
+class IndexCache:
+    '''
+    Persists the state of step and step usages registries for a single
+    project root. The cache is keyed by mtime and size of every feature file
+    and step module behave uses, so that only files changed since the last
+    run are re-indexed
+    '''
+    VERSION = 3
+
+    def __init__(self, cache_dir, directory):
+        self.directory = directory
+        key = hashlib.sha1(directory.encode('utf-8')).hexdigest()
+        self.file_name = os.path.join(cache_dir, key + '.json')
+
+    @staticmethod
+    def fingerprint(directory):
+        '''
+        Returns {relative file name: [mtime, size]} for feature files behave
+        runs (as configured by its paths option) and Python files of its
+        steps directory and environment
+        '''
+        file_names = get_feature_files(directory) + get_step_files(directory)
+        return IndexCache.fingerprint_files(directory, file_names)
+
+    @staticmethod
+    def fingerprint_files(directory, file_names):
+        '''
+        Same as fingerprint, but only for given files. Missing ones are left
+        out
+        '''
+        result = {}
+        for file_name in file_names:
+            try:
+                st = os.stat(os.path.join(directory, file_name))
+            except OSError:
+                continue
+            result[file_name] = [st.st_mtime, st.st_size]
+        return result
+
+    @staticmethod
+    def diff(old_fingerprint, new_fingerprint):
+        '''
+        Returns a tuple of (changed or added, removed) file names
+        '''
+        changed = [x for x, stat in new_fingerprint.items()
+                   if old_fingerprint.get(x) != stat]
+        removed = [x for x in old_fingerprint if x not in new_fingerprint]
+        return (sorted(changed), sorted(removed))
+
+    def load(self):
+        '''
+        Returns cached state or None if there's no usable cache
+        '''
+        try:
+            with open(self.file_name, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or \
+                state.get('version') != self.VERSION or \
+                state.get('directory') != self.directory:
+            return None
+        return state
+
+    def save(self, fingerprint, step_registry, step_usages_registry):
+        state = {
+            'version': self.VERSION,
+            'directory': self.directory,
+            'fingerprint': fingerprint,
+            'step_registry': step_registry.dump_state(),
+            'step_usages_registry': step_usages_registry.dump_state()
+        }
+        # Write to a temporary file first so a crash never leaves
+        # half-written cache behind
+        tmp_file_name = self.file_name + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+            with open(tmp_file_name, 'w', encoding='utf-8') as f:
+                json.dump(state, f, separators=(',', ':'))
+            os.replace(tmp_file_name, self.file_name)
+        except OSError as e:
+            print('SublimeBehave: Could not write index cache: {}'.format(e))
+
+    def clear(self):
+        try:
+            os.remove(self.file_name)
+        except OSError:
+            pass
@@ -0,0 +1,84 @@
+import sublime
+import threading
+
+class IndexJob:
+    '''
+    Pending index update of a single project
+    '''
+    def __init__(self):
+        self.full = False
+        self.use_cache = True
+        self.files = set()
+
+class IndexScheduler:
+    '''
+    Debounces index update requests and merges them into a single job per
+    project. Per-file usage updates are batched, a full re-index drops them
+    altogether. At most one job runs for a project at a time, requests made
+    meanwhile are run right after it. A full re-index requested meanwhile
+    makes the running job obsolete, so it's cancelled
+    '''
+    def __init__(self, run_job, cancel_job=None):
+        self.run_job = run_job
+        # Called with the root whose running job got superseded
+        self.cancel_job = cancel_job
+        self.lock = threading.Lock()
+        # root -> IndexJob
+        self.pending = {}
+        # roots with a job in progress
+        self.running = set()
+        # root -> number of the most recent request
+        self.generation = {}
+
+    def schedule_full(self, root, use_cache=False):
+        with self.lock:
+            job = self.pending.setdefault(root, IndexJob())
+            # Cache is used only if all merged requests allow that
+            job.use_cache = use_cache and (job.use_cache or not job.full)
+            job.full = True
+            job.files.clear()
+            superseded = root in self.running
+        if superseded and self.cancel_job is not None:
+            self.cancel_job(root)
+        self._trigger(root)
+
+    def schedule_files(self, root, file_names):
+        with self.lock:
+            job = self.pending.setdefault(root, IndexJob())
+            if not job.full:
+                job.files.update(file_names)
+        self._trigger(root)
+
+    def is_busy(self, root):
+        with self.lock:
+            return root in self.running or root in self.pending
+
+    def _trigger(self, root, delay=None):
+        if delay is None:
+            settings = sublime.load_settings('SublimeBehave.sublime-settings')
+            delay = settings.get('index_update_delay', 300)
+        with self.lock:
+            generation = self.generation.get(root, 0) + 1
+            self.generation[root] = generation
+        sublime.set_timeout_async(lambda: self._on_timeout(root, generation),
+                                  delay)
+
+    def _on_timeout(self, root, generation):
+        with self.lock:
+            # Superseded by a more recent request, or the running job will
+            # pick it up when done
+            if self.generation.get(root) != generation or root in self.running:
+                return
+            job = self.pending.pop(root, None)
+            if job is None:
+                return
+            self.running.add(root)
+
+        try:
+            self.run_job(root, job)
+        finally:
+            with self.lock:
+                self.running.discard(root)
+                again = root in self.pending
+            if again:
+                self._trigger(root, 0)
@@ -0,0 +1,63 @@
+import sublime
+import sublime_plugin
+
+from .project_registry import projects
+from .timing import operation_log, get_size
+from .utils import get_project_root
+
+def _format_size(size):
+    if size >= 2 ** 20:
+        return '{:.1f} MB'.format(size / 2 ** 20)
+    return '{:.1f} KB'.format(size / 2 ** 10)
+
+class SbShowIndexStatsCommand(sublime_plugin.WindowCommand):
+    '''
+    Shows size of the index of every project kept in memory and the most
+    recent operations along with time spent in each of their phases
+    '''
+    def __init__(self, window):
+        super(SbShowIndexStatsCommand, self).__init__(window)
+
+    def run(self, count=20):
+        sublime.set_timeout_async(lambda: self.run_impl(count), 0)
+
+    def run_impl(self, count):
+        lines = []
+        current = get_project_root(self.window)
+        for project in projects.get_projects():
+            lines.extend(self._format_project(project, project.root == current))
+            lines.append('')
+        lines.append('Recent operations:')
+        operations = operation_log.recent(count)
+        if len(operations) == 0:
+            lines.append('  None yet')
+        lines.extend(x.format() for x in operations)
+
+        panel = self.window.create_output_panel('behave.stats')
+        panel.run_command('append', {'characters': '\n'.join(lines),
+                                     'scroll_to_end': False})
+        self.window.run_command("show_panel", {"panel": "output.behave.stats"})
+
+    def _format_project(self, project, is_current):
+        step_registry = project.step_registry
+        step_usages_registry = project.step_usages_registry
+        step_defs = sum(len(x) for x in step_registry.step_defs.values())
+        usages = sum(len(x) for x in step_usages_registry.step_usages.values())
+        # Walks every object in the registries, may take a while
+        definitions_size = get_size(step_registry)
+        # Step usages refer to step definitions of the project
+        usages_size = get_size(project) - definitions_size
+
+        return [
+            'Project:           {}{}'.format(
+                project.root, ' (current)' if is_current else ''),
+            'Step definitions:  {}'.format(step_defs),
+            'Step usages:       {} in {} feature files'.format(
+                usages, len(step_usages_registry.step_usages)),
+            'Memory:            {} (step definitions {}, step usages {})'.format(
+                _format_size(definitions_size + usages_size),
+                _format_size(definitions_size), _format_size(usages_size)),
+        ]
+
+    def is_enabled(self):
+        return get_project_root(self.window) is not None
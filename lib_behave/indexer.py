@@ -0,0 +1,140 @@
+import os
+import re
+
+from .behave_config import get_base_dir, read_configuration
+from .host import status_message
+from .index_cache import IndexCache
+from .process_registry import BehaveCancelledError
+from .timing import timed_phase
+
+# Above this many changed feature files it's cheaper to re-index everything
+MAX_INCREMENTAL_FILES = 100
+PARSE_ERROR_REGEX = re.compile(r'Failed to parse "(.*?)":.*?, at line (\d+)',
+                               re.DOTALL)
+
+def update_index(root, step_registry, step_usages_registry, cache=None,
+                 use_cache=True, update_usages=None):
+    '''
+    Indexes the whole project. Given an IndexCache, only feature files
+    changed since it was saved are indexed again (if possible) and the index
+    is saved back. update_usages(file names) updates usages of given files
+    and returns the ones it updated, update_step_usages by default. Returns
+    fingerprint of files the index is up to date with
+    '''
+    if update_usages is None:
+        update_usages = lambda file_names: update_step_usages(
+            root, step_usages_registry, file_names)
+    # Take fingerprint before running behave so files modified meanwhile
+    # are picked up next time
+    with timed_phase('fingerprint'):
+        fingerprint = IndexCache.fingerprint(root)
+    if cache is None:
+        step_registry.update_definitions(root)
+        _update_all_usages(root, step_usages_registry, update_usages)
+        return fingerprint
+
+    with timed_phase('load cache'):
+        state = cache.load() if use_cache else None
+    failed = None
+    if state is not None:
+        failed = update_from_cache(root, step_registry, step_usages_registry,
+                                   state, fingerprint, update_usages)
+    if failed is None:
+        step_registry.update_definitions(root)
+        failed = _update_all_usages(root, step_usages_registry,
+                                    update_usages)
+    # Files which failed to parse count as changed next time, so they are
+    # indexed (and reported) again
+    with timed_phase('save cache'):
+        cache.save({x: y for x, y in fingerprint.items() if x not in failed},
+                   step_registry, step_usages_registry)
+    return fingerprint
+
+def update_from_cache(root, step_registry, step_usages_registry, state,
+                      fingerprint, update_usages):
+    '''
+    Loads registries from cached state and re-indexes only changed feature
+    files. Returns names of those which failed to parse, None if full update
+    is required
+    '''
+    changed, removed = IndexCache.diff(state['fingerprint'], fingerprint)
+    if not is_incremental(root, changed, removed):
+        return None
+
+    with timed_phase('load cached state'):
+        step_registry.load_state(state['step_registry'])
+        step_usages_registry.load_state(state['step_usages_registry'])
+    step_usages_registry.remove_step_usages(removed)
+    failed = []
+    if len(changed) > 0:
+        failed = sorted(set(changed).difference(update_usages(changed)))
+    status_message('Behave: Loaded index from cache')
+    return failed
+
+def is_incremental(root, changed, removed):
+    '''
+    Tells if usages of changed (and removed) files can be updated on their
+    own, without indexing the whole project again
+    '''
+    if len(changed) + len(removed) > MAX_INCREMENTAL_FILES:
+        return False
+    # Any change to step files or environment.py may shift step
+    # definitions which every usage refers to
+    if any(not x.endswith('.feature') for x in changed + removed):
+        return False
+    # behave looks for steps next to the first file it's given, which
+    # must be where it finds them when running the configured paths
+    config = read_configuration(root)
+    base_dir = get_base_dir(root, config=config)
+    return all(get_base_dir(root, x, config) == base_dir for x in changed)
+
+def _update_all_usages(root, step_usages_registry, update_usages):
+    '''
+    Indexes usages of all feature files. If some fail to parse, the rest is
+    indexed without them. Returns names of those which failed
+    '''
+    try:
+        step_usages_registry.update_step_usages(root)
+        return []
+    except BehaveCancelledError:
+        raise
+    except Exception as e:
+        if not PARSE_ERROR_REGEX.search(str(e)):
+            raise
+    # behave stops at the first file it can't parse, go over the list of
+    # files instead which skips them one by one
+    file_names = step_usages_registry.get_feature_files(root)
+    step_usages_registry.remove_step_usages(
+        set(step_usages_registry.step_usages).difference(file_names))
+    return sorted(set(file_names).difference(update_usages(file_names)))
+
+def update_step_usages(root, step_usages_registry, file_names,
+                       on_parse_error=None):
+    '''
+    Updates usages of given feature files in one go. A file which fails to
+    parse is reported to on_parse_error(path, line) and the rest is updated
+    without it. Returns names of updated files
+    '''
+    removed = [x for x in file_names
+               if not os.path.isfile(os.path.join(root, x))]
+    step_usages_registry.remove_step_usages(removed)
+    file_names = [x for x in file_names if x not in removed]
+    while len(file_names) > 0:
+        try:
+            step_usages_registry.update_step_usages(root, file_names)
+        except BehaveCancelledError:
+            raise
+        except Exception as e:
+            match = PARSE_ERROR_REGEX.search(str(e))
+            if not match:
+                raise
+            file_name = os.path.normpath(os.path.join(root, match.group(1)))
+            if on_parse_error is not None:
+                on_parse_error(file_name, int(match.group(2)))
+            bad_file_name = os.path.relpath(file_name, root)
+            if bad_file_name not in file_names:
+                raise
+            file_names.remove(bad_file_name)
+        else:
+            break
+    return file_names
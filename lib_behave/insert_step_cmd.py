@@ -2,36 +2,43 @@ import sublime
 import sublime_plugin
 import re
 
-from .step_registry import step_registry
-from .utils import is_feature_file_in_project, get_phrase_from_line
+from .project_registry import projects
+from .timing import timed
+from .utils import is_feature_file_in_project, \
+    get_view_root, \
+    get_phrase_from_line
 
 class SbInsertNewStepCommand(sublime_plugin.TextCommand):
     STEP_PHRASE_PATTERN = re.compile('\{([^\}]*)\}')
 
     def __init__(self, view):
         super(SbInsertNewStepCommand, self).__init__(view)
+        self.step_list = None
 
-    def run(self, edit):
-        if step_registry.get_count() == 0:
+    @timed('Insert new step')
+    def run(self, edit, step_type=None):
+        step_registry = projects.get(get_view_root(self.view)).step_registry
+        self.step_list = step_registry.get_step_list(step_type)
+        if len(self.step_list) == 0:
             steps_list = ['No step definitions available']
             callback = None
         else:
-            steps_list = [[x.phrase, '{}:{}'.format(x.file_name, x.line)]
-                          for x in step_registry]
+            steps_list = self.step_list.items
             callback = self._steps_found
         self.view.window().show_quick_panel(steps_list, callback)
 
     def _steps_found(self, index):
         if index < 0:
             return
-        sel_step = step_registry.get_definition_by_index(index)
+        sel_step = self.step_list.get(index)
         if sel_step is None:
             return
 
         contents = self._snippetize_step(sel_step.phrase)
         self.view.run_command('insert_snippet', {'contents': contents})
 
-    def _snippetize_step(self, input):
+    @classmethod
+    def _snippetize_step(cls, input):
         '''
         Turns 'Then {item:s} will be {value:d}'
         into 'Then "${1:item:s}" will be "${2:value:d}"'
@@ -50,7 +57,7 @@ class SbInsertNewStepCommand(sublime_plugin.TextCommand):
         def sub_cb(matchobj, index):
             return '"${{{}:{}}}"'.format(index, matchobj.group(1))
 
-        return self.STEP_PHRASE_PATTERN.sub(sub_cb, input)
+        return cls.STEP_PHRASE_PATTERN.sub(sub_cb, input)
 
     def is_enabled(self):
         return is_feature_file_in_project(self.view)
\ No newline at end of file
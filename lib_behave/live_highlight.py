@@ -0,0 +1,87 @@
+import time
+
+from .gherkin_parser import GherkinParser
+
+class LiveHighlighter:
+    '''
+    Tracks undefined steps of a single (possibly unsaved) feature file.
+    Only the sections (scenario with its examples) containing lines changed
+    since the previous update are parsed and matched again
+    '''
+    BOUNDARY_SECTIONS = ('Feature', 'Rule', 'Background', 'Scenario Outline',
+                         'Scenario Template', 'Scenario')
+
+    def __init__(self):
+        self.parser = GherkinParser()
+        self.lines = []
+        # is undefined, for every line
+        self.undefined = []
+        self.matcher = None
+        # Duration (seconds) of the previous update
+        self.duration = 0
+
+    def update(self, lines, matcher):
+        '''
+        Returns numbers of lines (1-based) with undefined steps
+        '''
+        start_time = time.time()
+        if matcher is not self.matcher:
+            # Definitions changed, everything needs to be matched again
+            self.matcher = matcher
+            self.lines = []
+            self.undefined = []
+
+        # Lines in common at the beginning and the end are not dirty
+        count = min(len(lines), len(self.lines))
+        prefix = 0
+        while prefix < count and lines[prefix] == self.lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < count - prefix and \
+                lines[-1 - suffix] == self.lines[-1 - suffix]:
+            suffix += 1
+
+        if prefix < len(lines) or len(lines) != len(self.lines):
+            if self._has_docstring(lines[prefix:len(lines) - suffix]) or \
+                    self._has_docstring(self.lines[prefix:len(self.lines) - suffix]):
+                # Docstrings may span sections, start from scratch
+                start, end = 0, len(lines)
+            else:
+                # New section header splits the one above, start there
+                start = self._get_section_start(lines, prefix - 1)
+                end = self._get_section_end(lines, len(lines) - suffix)
+            undefined = self._match_lines(lines[start:end])
+            old_end = end + len(self.lines) - len(lines)
+            self.undefined = self.undefined[:start] + undefined + \
+                self.undefined[old_end:]
+            self.lines = list(lines)
+
+        self.duration = time.time() - start_time
+        return [x + 1 for x, is_undefined in enumerate(self.undefined)
+                if is_undefined]
+
+    def _is_boundary(self, line):
+        match = self.parser.SECTION_PATTERN.match(line.strip())
+        return match is not None and match.group(1) in self.BOUNDARY_SECTIONS
+
+    def _has_docstring(self, lines):
+        return any(x.strip().startswith(('"""', '```')) for x in lines)
+
+    def _get_section_start(self, lines, index):
+        index = max(min(index, len(lines) - 1), 0)
+        while index > 0 and not self._is_boundary(lines[index]):
+            index -= 1
+        return index
+
+    def _get_section_end(self, lines, index):
+        while index < len(lines) and not self._is_boundary(lines[index]):
+            index += 1
+        return index
+
+    def _match_lines(self, lines):
+        undefined = [False] * len(lines)
+        for step in self.parser.parse_lines('', lines, strict=False):
+            if any(self.matcher.match(step.step_type, text) is None
+                   for text in step.texts()):
+                undefined[step.line - 1] = True
+        return undefined
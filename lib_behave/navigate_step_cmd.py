@@ -2,9 +2,10 @@ import sublime
 import sublime_plugin
 import os
 
-from .step_registry import step_registry
-from .step_usages_registry import step_usages_registry
+from .project_registry import projects
+from .timing import timed
 from .utils import get_project_root, \
+    get_view_root, \
     is_feature_file_in_project, \
     is_step_file_in_project, \
     get_phrase_from_line, \
@@ -12,29 +13,43 @@ from .utils import get_project_root, \
 
 class SbListStepsCommand(sublime_plugin.WindowCommand):
     '''
-    Lists all defined steps in Sublime's Quick Panel and goes to selected one
+    Lists defined steps (all, of given type or of the current file) in
+    Sublime's Quick Panel and goes to selected one
     '''
     def __init__(self, window):
         super(SbListStepsCommand, self).__init__(window)
-
-    def run(self):
-        if step_registry.get_count() == 0:
+        self.step_registry = None
+        self.step_list = None
+
+    @timed('List steps')
+    def run(self, step_type=None, current_file=False):
+        root = get_project_root(self.window)
+        file_name = None
+        view = self.window.active_view()
+        if current_file and view is not None and view.file_name():
+            file_name = os.path.relpath(view.file_name(), root)
+
+        # Selection refers to the list shown, even if definitions change
+        # meanwhile
+        self.step_registry = projects.get(root).step_registry
+        self.step_list = self.step_registry.get_step_list(step_type, file_name)
+        if len(self.step_list) == 0:
             steps_list = ['No step definitions available']
             callback = None
         else:
-            steps_list = [[x.phrase, '{}:{}'.format(x.file_name, x.line)]
-                          for x in step_registry]
+            steps_list = self.step_list.items
             callback = self._steps_found
         self.window.show_quick_panel(steps_list, callback)
 
     def _steps_found(self, index):
         if index < 0:
             return
-        sel_step = step_registry.get_definition_by_index(index)
+        sel_step = self.step_list.get(index)
         if sel_step is None:
             return
 
-        file_path = os.path.join(step_registry.directory, sel_step.file_name)
+        file_path = os.path.join(self.step_registry.directory,
+                                 sel_step.file_name)
         self.window.open_file('{}:{}'.format(file_path, sel_step.line),
                               sublime.ENCODED_POSITION)
 
@@ -48,12 +63,14 @@ class SbGotoStepDefinitionCommand(sublime_plugin.TextCommand):
     def __init__(self, view):
         super(SbGotoStepDefinitionCommand, self).__init__(view)
 
+    @timed('Go to step definition')
     def run(self, edit, event):
-        root = get_project_root(self.view.window())
+        root = get_view_root(self.view)
         file_name = os.path.relpath(self.view.file_name(), root)
         line_no = get_line_from_cursor(self.view, event)
 
-        result = step_usages_registry.get_step_definition(file_name, line_no)
+        result = projects.get(root).step_usages_registry \
+            .get_step_definition(file_name, line_no)
         if result is None or result[1] == -1:
             sublime.status_message('Can\' find definition for step: `{}`'.format(
                 self.view.substr(get_phrase_from_line(self.view, line_no))))
@@ -75,12 +92,14 @@ class SbFindAllStepReferencesCommand(sublime_plugin.TextCommand):
     def __init__(self, view):
         super(SbFindAllStepReferencesCommand, self).__init__(view)
 
+    @timed('Find step references')
     def run(self, edit, event):
-        root = get_project_root(self.view.window())
+        root = get_view_root(self.view)
         file_name = os.path.relpath(self.view.file_name(), root)
         line_no = get_line_from_cursor(self.view, event)
 
-        refs = step_usages_registry.get_step_references(file_name, line_no)
+        refs = projects.get(root).step_usages_registry \
+            .get_step_references(file_name, line_no)
         if len(refs) > 0:
             contents = 'Step references:\n'
             contents += '\n'.join('  {}:{}'.format(ref[0], ref[1]) for ref in refs)
@@ -126,54 +145,96 @@ class SbGotoStepReferenceCommand(sublime_plugin.TextCommand):
         return True
 
 class SbShowDefinitionEventListener(sublime_plugin.EventListener):
+    # Same as in Default.symbol.py
+    POPUP_TEMPLATE = '''
+        <body>
+          <style>
+            body {{
+              font-family: sans-serif;
+            }}
+            h1 {{ 
+              font-size: 1.1rem;
+              font-weight: bold;
+              margin: 0 0 0.25em 0;
+            }}
+            p {{
+              font-size: 1.05rem;
+              margin: 0;
+            }}
+          </style>
+          <h1>Definition:</h1>
+          <p><a href="{}">{}</a></p>
+        </body>
+    '''
+
+    def __init__(self):
+        super(SbShowDefinitionEventListener, self).__init__()
+        self.show_definitions = None
+        # view id -> (cache key, root, file name, {line: popup content})
+        self.view_cache = {}
+
     def on_hover(self, view, point, hover_zone):
-        if not sublime.load_settings(
-                'SublimeBehave.sublime-settings').get('show_definitions'):
-            return
         if hover_zone != sublime.HOVER_TEXT:
             return
+        if not self._get_show_definitions():
+            return
         if not is_feature_file_in_project(view):
             return
 
-        root = get_project_root(view.window())
-        file_name = os.path.relpath(view.file_name(), root)
+        _, root, file_name, popups = self._get_view_cache(view)
         line_no = view.rowcol(point)[0] + 1
-        result = step_usages_registry.get_step_definition(file_name, line_no)
-
-        if result is None or result[1] == -1:
+        if line_no not in popups:
+            popups[line_no] = self._render_popup(root, file_name, line_no)
+        content = popups[line_no]
+        if content is None:
             return
 
         def on_navigate(href):
             view.window().open_file(href, sublime.ENCODED_POSITION)
 
-        file_location = '{}:{}'.format(os.path.join(root, result[0]), result[1])
-        disp_file_location = '{}:{}'.format(result[0], result[1])
-
-        # Same as in Default.symbol.py
-        content = '''
-            <body>
-              <style>
-                body {{
-                  font-family: sans-serif;
-                }}
-                h1 {{ 
-                  font-size: 1.1rem;
-                  font-weight: bold;
-                  margin: 0 0 0.25em 0;
-                }}
-                p {{
-                  font-size: 1.05rem;
-                  margin: 0;
-                }}
-              </style>
-              <h1>Definition:</h1>
-              <p><a href="{}">{}</a></p>
-            </body>
-        '''.format(file_location, disp_file_location)
-
         view.show_popup(
             content, 
             flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
             location=point,
             on_navigate=on_navigate,
             max_width=1024)
+
+    def on_close(self, view):
+        self.view_cache.pop(view.id(), None)
+
+    def _get_show_definitions(self):
+        if self.show_definitions is None:
+            settings = sublime.load_settings('SublimeBehave.sublime-settings')
+            settings.clear_on_change('SublimeBehave.show_definitions')
+            settings.add_on_change('SublimeBehave.show_definitions',
+                                   lambda: self._settings_changed(settings))
+            self._settings_changed(settings)
+        return self.show_definitions
+
+    def _settings_changed(self, settings):
+        self.show_definitions = settings.get('show_definitions')
+
+    def _get_view_cache(self, view):
+        '''
+        Popups rendered so far for the view, dropped whenever the view or
+        the index of step usages changes
+        '''
+        root = get_view_root(view)
+        key = (projects.get(root).step_usages_registry.version,
+               view.change_count(), view.file_name(), root)
+        cache = self.view_cache.get(view.id())
+        if cache is None or cache[0] != key:
+            file_name = os.path.relpath(view.file_name(), root)
+            cache = (key, root, file_name, {})
+            self.view_cache[view.id()] = cache
+        return cache
+
+    def _render_popup(self, root, file_name, line_no):
+        result = projects.get(root).step_usages_registry \
+            .get_step_definition(file_name, line_no)
+        if result is None or result[1] == -1:
+            return None
+
+        file_location = '{}:{}'.format(os.path.join(root, result[0]), result[1])
+        disp_file_location = '{}:{}'.format(result[0], result[1])
+        return self.POPUP_TEMPLATE.format(file_location, disp_file_location)
@@ -0,0 +1,51 @@
+import sublime
+import threading
+from collections import deque
+
+class PanelWriter:
+    '''
+    Collects text written from any thread and appends it to the panel in
+    batches, at most once every FLUSH_INTERVAL ms. If the panel can't keep
+    up, only the most recent MAX_BUFFERED_LINES lines are kept and the rest
+    is replaced by a note on how many lines were dropped
+    '''
+    FLUSH_INTERVAL = 100
+    MAX_BUFFERED_LINES = 2000
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.lock = threading.Lock()
+        self.lines = deque(maxlen=self.MAX_BUFFERED_LINES)
+        self.dropped = 0
+        self.flush_scheduled = False
+
+    def write(self, text):
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append(text)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        sublime.set_timeout(self._flush, self.FLUSH_INTERVAL)
+
+    def close(self):
+        '''
+        Writes out whatever is left right away
+        '''
+        with self.lock:
+            self.flush_scheduled = True
+        sublime.set_timeout(self._flush, 0)
+
+    def _flush(self):
+        with self.lock:
+            lines, self.lines = self.lines, deque(maxlen=self.MAX_BUFFERED_LINES)
+            dropped, self.dropped = self.dropped, 0
+            self.flush_scheduled = False
+        if dropped > 0:
+            lines.appendleft('[... {} lines of output dropped ...]\n'.format(
+                dropped))
+        if len(lines) == 0:
+            return
+        self.panel.run_command('append', {'characters': ''.join(lines),
+                                          'scroll_to_end': True})
@@ -0,0 +1,130 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from .utils import get_startupinfo
+
+class BehaveCancelledError(Exception):
+    '''
+    behave process was cancelled or killed after a timeout
+    '''
+    pass
+
+def start_process(command, cwd, **kwargs):
+    '''
+    Starts a process in its own process group, so everything it starts can
+    be killed along with it
+    '''
+    if os.name == 'posix':
+        kwargs['start_new_session'] = True
+    return subprocess.Popen(command, cwd=cwd, startupinfo=get_startupinfo(),
+                            **kwargs)
+
+def kill_process(process):
+    '''
+    Kills the process along with its whole process group (or tree)
+    '''
+    if process is None or process.poll() is not None:
+        return
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        elif os.name == 'nt':
+            subprocess.call(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL,
+                            startupinfo=get_startupinfo())
+    except OSError:
+        pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+class TrackedProcess:
+    def __init__(self, process, cwd, dry_run):
+        self.process = process
+        self.cwd = cwd
+        self.dry_run = dry_run
+        self.start = time.time()
+        # Why it was killed, None while it's allowed to run
+        self.reason = None
+        # Set once the caller is done with the process
+        self.done = False
+
+class ProcessRegistry:
+    '''
+    Tracks running behave processes so they can be cancelled or killed
+    once they run out of time
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = set()
+        # cwd -> number of cancellations, lets runners made of many
+        # processes stop starting new ones
+        self.generations = {}
+
+    @contextmanager
+    def track(self, process, cwd, dry_run, timeout=None):
+        '''
+        Tracks the process for the duration of the block. It's killed once
+        it runs longer than timeout (seconds) unless that's None or 0
+        '''
+        tracked = TrackedProcess(process, cwd, dry_run)
+        with self.lock:
+            self.processes.add(tracked)
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, lambda: self._kill(
+                tracked, 'behave timed out after {} seconds'.format(timeout)))
+            timer.daemon = True
+            timer.start()
+        try:
+            yield tracked
+        finally:
+            with self.lock:
+                tracked.done = True
+                self.processes.discard(tracked)
+            if timer is not None:
+                timer.cancel()
+
+    def cancel(self, cwd=None, dry_run_only=False):
+        '''
+        Kills processes of the project (all if None), returns their number
+        '''
+        with self.lock:
+            processes = [x for x in self.processes
+                         if (cwd is None or x.cwd == cwd) and
+                         (x.dry_run or not dry_run_only)]
+            if not dry_run_only:
+                for key in set(self.generations) | set([cwd]):
+                    if cwd is None or key == cwd:
+                        self.generations[key] = \
+                            self.generations.get(key, 0) + 1
+        for tracked in processes:
+            self._kill(tracked, 'behave was cancelled')
+        return len(processes)
+
+    def get_generation(self, cwd):
+        with self.lock:
+            return self.generations.get(cwd, 0)
+
+    def get_running(self, cwd=None):
+        with self.lock:
+            return [x for x in self.processes if cwd is None or x.cwd == cwd]
+
+    def _kill(self, tracked, reason):
+        # Timer may fire after the process is done, its output is complete
+        # then and must not be discarded
+        with self.lock:
+            if tracked.reason is not None or tracked.done or \
+                    tracked.process is None or \
+                    tracked.process.poll() is not None:
+                return
+            tracked.reason = reason
+        kill_process(tracked.process)
+
+running_processes = ProcessRegistry()
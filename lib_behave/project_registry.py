@@ -0,0 +1,89 @@
+import sublime
+import threading
+from collections import OrderedDict
+
+from .step_registry import StepRegistry
+from .step_usages_registry import StepUsagesRegistry
+
+class Project:
+    '''
+    Index of a single behave project
+    '''
+    def __init__(self, root):
+        self.root = root
+        self.step_registry = StepRegistry()
+        self.step_usages_registry = StepUsagesRegistry(self.step_registry)
+        # Set once the whole project was indexed (or loaded from cache)
+        self.indexed = False
+        # ImpactBaseline the next 'Run affected scenarios' compares with
+        self.impact_baseline = None
+
+    def get_size(self):
+        '''
+        Number of indexed step definitions and step usages, including those
+        kept by the impact baseline
+        '''
+        size = sum(len(x) for x in self.step_registry.step_defs.values()) + \
+            sum(len(x) for x in self.step_usages_registry.step_usages.values())
+        impact_baseline = self.impact_baseline
+        if impact_baseline is not None:
+            size += impact_baseline.get_size()
+        return size
+
+class ProjectRegistry:
+    '''
+    Projects by their root directory. Above the configured limits the least
+    recently used projects, which are no longer open in any window, are
+    evicted. Evicted project is loaded from the index cache once it's used
+    again
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        # root -> Project, the least recently used first
+        self.projects = OrderedDict()
+
+    def get(self, root):
+        '''
+        Returns project of given root (created if necessary) and marks it
+        as the most recently used one
+        '''
+        with self.lock:
+            project = self.projects.pop(root, None)
+            created = project is None
+            if created:
+                project = Project(root)
+            self.projects[root] = project
+        if created:
+            self.evict()
+        return project
+
+    def get_projects(self):
+        '''
+        Returns all projects, the most recently used first
+        '''
+        with self.lock:
+            return list(reversed(self.projects.values()))
+
+    def evict(self):
+        settings = sublime.load_settings('SublimeBehave.sublime-settings')
+        max_projects = settings.get('max_projects', 5)
+        max_steps = settings.get('max_indexed_steps', 0)
+        open_roots = set(x for window in sublime.windows()
+                         for x in window.folders())
+
+        with self.lock:
+            sizes = OrderedDict((root, project.get_size())
+                                for root, project in self.projects.items())
+            # The most recently used project always stays
+            for root in list(sizes)[:-1]:
+                over_count = max_projects > 0 and len(sizes) > max_projects
+                over_size = max_steps > 0 and sum(sizes.values()) > max_steps
+                if not over_count and not over_size:
+                    break
+                if root in open_roots:
+                    continue
+                del sizes[root]
+                del self.projects[root]
+                print('SublimeBehave: Evicted index of ' + root)
+
+projects = ProjectRegistry()
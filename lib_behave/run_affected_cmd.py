@@ -0,0 +1,48 @@
+import sublime
+
+from .impact import ImpactBaseline, \
+    get_affected_locations, \
+    get_scenario_locations
+from .project_registry import projects
+from .run_behave_cmd import SbRunBehaveCommand
+from .timing import timed
+from .update_registry_cmd import index_scheduler
+from .utils import get_project_root
+
+class SbRunAffectedScenariosCommand(SbRunBehaveCommand):
+    '''
+    Runs only scenarios with steps using definitions added, changed or
+    removed since the previous run of this command (or since the project
+    was indexed)
+    '''
+    def __init__(self, window):
+        super(SbRunAffectedScenariosCommand, self).__init__(window)
+
+    @timed('Run affected scenarios')
+    def run_impl(self, processes=None):
+        root = get_project_root(self.window)
+        project = projects.get(root)
+        if not project.indexed or index_scheduler.is_busy(root):
+            sublime.status_message(
+                'Behave: Index is being updated, try again once it\'s done')
+            return
+
+        baseline = ImpactBaseline(root, project.step_registry,
+                                  project.step_usages_registry)
+        previous = project.impact_baseline
+        # Changes made while running are picked up next time
+        project.impact_baseline = baseline
+        if previous is None:
+            sublime.status_message(
+                'Behave: Nothing to compare with, changes are tracked from now')
+            return
+
+        feature_files = get_scenario_locations(
+            root, get_affected_locations(previous, baseline))
+        if len(feature_files) == 0:
+            sublime.status_message(
+                'Behave: No scenarios affected by changes since the last run')
+            return
+        sublime.status_message('Behave: Running {} affected scenarios'.format(
+            len(feature_files)))
+        self.run_in_panel(root, feature_files, processes)
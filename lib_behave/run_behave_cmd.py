@@ -1,35 +1,294 @@
 import sublime
 import sublime_plugin
 import os
+import re
+import time
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from .behave_command import BehaveCommand
-from .utils import get_project_root, is_feature_file_in_project
+from .behave_config import read_configuration
+from .panel_writer import PanelWriter
+from .process_registry import running_processes, BehaveCancelledError
+from .run_history import RunHistory, read_json_results
+from .step_usages_registry import StepUsagesRegistry, split_paths
+from .timing import timed
+from .utils import get_project_root, is_feature_file_in_project, get_cache_dir
+
+def get_format_args(root):
+    '''
+    Returns options of the formatter printing to stdout alongside the JSON
+    one. Formatters configured for behave still write to their files, but
+    once any is given on the command line behave no longer adds its default
+    one, so it's given here unless the run_format setting says otherwise
+    '''
+    settings = sublime.load_settings('SublimeBehave.sublime-settings')
+    run_format = settings.get('run_format')
+    if not run_format:
+        run_format = read_configuration(root).get('default_format') or \
+            'pretty'
+    return ['-f', run_format]
+
+class RunSummary:
+    '''
+    Adds up summaries printed by behave processes of a parallel run
+    '''
+    KINDS = ('feature', 'scenario', 'step')
+    SUMMARY_PATTERN = re.compile(r'^(\d+) (feature|scenario|step)s? passed, (.*)$',
+                                 re.MULTILINE)
+    COUNT_PATTERN = re.compile(r'(\d+) (\w+)')
+
+    def __init__(self):
+        # kind -> {status: count}
+        self.counts = {kind: OrderedDict() for kind in self.KINDS}
+        self.errors = 0
+
+    def add(self, output):
+        for match in self.SUMMARY_PATTERN.finditer(output):
+            counts = self.counts[match.group(2)]
+            self._add_count(counts, 'passed', match.group(1))
+            for count, status in self.COUNT_PATTERN.findall(match.group(3)):
+                self._add_count(counts, status, count)
+
+    def add_error(self):
+        self.errors += 1
+
+    def _add_count(self, counts, status, count):
+        counts[status] = counts.get(status, 0) + int(count)
+
+    def is_failed(self):
+        return self.errors > 0 or \
+            any(counts.get('failed', 0) > 0 or counts.get('undefined', 0) > 0
+                for counts in self.counts.values())
+
+    def format(self):
+        lines = []
+        for kind in self.KINDS:
+            counts = self.counts[kind]
+            if len(counts) == 0:
+                continue
+            statuses = ['{} {}'.format(count, status)
+                        for status, count in counts.items()]
+            # Same as behave: '2 features passed, 0 failed, 0 skipped'
+            passed = counts.get('passed', 0)
+            statuses[0] = '{} {}{} passed'.format(passed, kind,
+                                                  '' if passed == 1 else 's')
+            lines.append(', '.join(statuses))
+        if self.errors > 0:
+            lines.append('{} behave processes failed to run'.format(self.errors))
+        return '\n'.join(lines)
 
 class SbRunBehaveCommand(sublime_plugin.WindowCommand):
     def __init__(self, window):
         super(SbRunBehaveCommand, self).__init__(window)
 
-    def run(self):
-        sublime.set_timeout_async(self.run_impl, 0)
+    def run(self, processes=None):
+        sublime.set_timeout_async(lambda: self.run_impl(processes), 0)
 
-    def run_impl(self):
+    @timed('Run behave')
+    def run_impl(self, processes=None):
         root = get_project_root(self.window)
         view = self.window.active_view()
         feature_files = []
         if is_feature_file_in_project(view):
-            for sel in view.sel(): 
+            for sel in view.sel():
                 line_no = view.rowcol(sel.begin())[0] + 1
                 file_name = os.path.relpath(view.file_name(), root)
                 feature_files.append('{}:{}'.format(file_name, line_no))
+        self.run_in_panel(root, feature_files, processes)
 
+    def run_in_panel(self, root, feature_files, processes):
         panel = self.window.create_output_panel('behave')
         self.window.run_command("show_panel", {"panel": "output.behave"})
 
-        def append_fun(line):
-            panel.run_command('append', {'characters': line,
-                                         'scroll_to_end': True})
+        # Appending every line on its own would freeze the UI on chatty runs
+        writer = PanelWriter(panel)
+        try:
+            self.run_behave(root, feature_files, processes, writer.write)
+        except BehaveCancelledError as e:
+            writer.write('\nStopped, {}\n'.format(e))
+            sublime.status_message('Behave: Run stopped, {}'.format(e))
+        finally:
+            writer.close()
+
+    def run_behave(self, root, feature_files, processes, append_fun):
+        if processes is None:
+            settings = sublime.load_settings('SublimeBehave.sublime-settings')
+            processes = settings.get('run_processes', 1)
+        if processes <= 0:
+            processes = multiprocessing.cpu_count()
+        history = RunHistory(get_cache_dir(), root)
+        history.load()
+        if processes > 1:
+            items = feature_files or \
+                StepUsagesRegistry.get_feature_files(root)
+            if len(items) > 1:
+                self.run_parallel(root, items, processes, append_fun, history)
+                history.save()
+                return
+
+        out, results = self.run_with_results(root, feature_files, append_fun)
+        history.add_results(results, feature_files)
+        history.save()
+
+    def run_with_results(self, root, feature_files, append_fun=None):
+        '''
+        Runs behave with results of scenarios written by its JSON formatter
+        to a temporary file, alongside the usual output. Returns the output
+        and list of (location, status, seconds)
+        '''
+        fd, json_file = tempfile.mkstemp(prefix='sb-run-', suffix='.json')
+        os.close(fd)
+        # Output file goes to the JSON formatter (after those of behave's
+        # configuration), the other one prints to stdout
+        args = ['--no-skipped', '-f', 'json', '-o', json_file] + \
+            get_format_args(root) + feature_files
+        try:
+            if append_fun:
+                out = BehaveCommand().run(root, *args, append_fun=append_fun)
+            else:
+                out = BehaveCommand().run(root, *args)
+            return out, read_json_results(json_file)
+        finally:
+            try:
+                os.remove(json_file)
+            except OSError:
+                pass
+
+    def run_parallel(self, root, items, processes, append_fun, history):
+        '''
+        Splits feature files (or scenarios) into `processes` batches which
+        should take about as long, judging by previous runs, and runs every
+        batch by its own behave process (more if it doesn't fit a single
+        command line). Output of every batch is appended to the panel in one
+        piece when it finishes
+        '''
+        batches = history.split_balanced(items, processes)
+        summary = RunSummary()
+        lock = threading.Lock()
+        # Changes once the run is cancelled
+        generation = running_processes.get_generation(root)
+
+        append_fun('Running {} items in {} behave processes\n\n'.format(
+            len(items), len(batches)))
+        sublime.status_message('Behave: Running {} items in parallel'.format(
+            len(items)))
+
+        def run_batch(batch):
+            output = []
+            for part in split_paths(batch):
+                if running_processes.get_generation(root) != generation:
+                    # Don't start the rest of a cancelled run
+                    break
+                start = time.time()
+                try:
+                    out, results = self.run_with_results(root, part)
+                except BehaveCancelledError as e:
+                    output.append('Stopped, {}\n'.format(e))
+                    break
+                except Exception as e:
+                    out = '\n'.join(str(x) for x in e.args) + '\n'
+                    with lock:
+                        summary.add_error()
+                    output.append(out)
+                    continue
+                duration = time.time() - start
+                with lock:
+                    history.set_durations(part, duration, results)
+                    history.add_results(results, part)
+                    summary.add(out)
+                output.append(out)
+            if len(output) > 0:
+                with lock:
+                    append_fun('\n'.join(output) + '\n')
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            list(executor.map(run_batch, batches))
+        duration = time.time() - start
+
+        if running_processes.get_generation(root) != generation:
+            result = 'CANCELLED'
+        else:
+            result = 'FAILED' if summary.is_failed() else 'PASSED'
+        append_fun('{}\n{}\nTook {}m{:.3f}s\n'.format(
+            result, summary.format(), int(duration // 60), duration % 60))
+        sublime.status_message('Behave: Parallel run {}'.format(result.lower()))
 
-        args = ['--no-skipped'] + feature_files
-        out = BehaveCommand().run(root, *args, append_fun=append_fun)
+    def is_enabled(self):
+        return get_project_root(self.window) is not None
+
+class SbRerunFailedScenariosCommand(SbRunBehaveCommand):
+    '''
+    Runs again scenarios which failed in previous runs
+    '''
+    def __init__(self, window):
+        super(SbRerunFailedScenariosCommand, self).__init__(window)
+
+    @timed('Rerun failed scenarios')
+    def run_impl(self, processes=None):
+        root = get_project_root(self.window)
+        history = RunHistory(get_cache_dir(), root)
+        history.load()
+        failed = history.get_failed()
+        if len(failed) == 0:
+            sublime.status_message('Behave: No failed scenarios to rerun')
+            return
+        sublime.status_message('Behave: Rerunning {} failed scenarios'.format(
+            len(failed)))
+        self.run_in_panel(root, failed, processes)
+
+class SbShowSlowestScenariosCommand(sublime_plugin.WindowCommand):
+    '''
+    Lists the slowest scenarios of previous runs in Sublime's Quick Panel
+    and goes to selected one
+    '''
+    def __init__(self, window):
+        super(SbShowSlowestScenariosCommand, self).__init__(window)
+        self.root = None
+        self.slowest = []
+
+    def run(self, count=50):
+        self.root = get_project_root(self.window)
+        history = RunHistory(get_cache_dir(), self.root)
+        history.load()
+        self.slowest = history.get_slowest(count)
+        if len(self.slowest) == 0:
+            self.window.show_quick_panel(['No scenarios run yet'], None)
+            return
+        self.window.show_quick_panel(
+            [[location, '{:.3f}s, {}'.format(duration, status)]
+             for location, status, duration in self.slowest],
+            self._scenario_selected)
+
+    def _scenario_selected(self, index):
+        if index < 0:
+            return
+        location = self.slowest[index][0]
+        self.window.open_file(os.path.join(self.root, location),
+                              sublime.ENCODED_POSITION)
+
+    def is_enabled(self):
+        return get_project_root(self.window) is not None
+
+class SbCancelBehaveCommand(sublime_plugin.WindowCommand):
+    '''
+    Kills behave processes of the project (runs, dry-runs of index updates)
+    along with everything they started
+    '''
+    def __init__(self, window):
+        super(SbCancelBehaveCommand, self).__init__(window)
+
+    def run(self):
+        count = running_processes.cancel(get_project_root(self.window))
+        if count == 0:
+            sublime.status_message('Behave: Nothing to cancel')
+        else:
+            sublime.status_message(
+                'Behave: Cancelled {} behave processes'.format(count))
 
     def is_enabled(self):
         return get_project_root(self.window) is not None
@@ -0,0 +1,154 @@
+import os
+import json
+import hashlib
+
+class RunHistory:
+    '''
+    Remembers how long running every feature file (or scenario) of a single
+    project took, so parallel runs can balance them among processes. Along
+    with status and duration of every scenario, taken from behave's JSON
+    output
+    '''
+    FAILED_STATUSES = ('failed', 'error')
+
+    def __init__(self, cache_dir, directory):
+        self.directory = directory
+        key = hashlib.sha1(directory.encode('utf-8')).hexdigest()
+        self.file_name = os.path.join(cache_dir, key + '.durations.json')
+        # item (file or file:line) -> seconds
+        self.durations = {}
+        # scenario location (file:line) -> [status, seconds]
+        self.scenarios = {}
+
+    def load(self):
+        try:
+            with open(self.file_name, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if not isinstance(state, dict) or \
+                state.get('directory') != self.directory:
+            state = {}
+        self.durations = state.get('durations', {})
+        self.scenarios = state.get('scenarios', {})
+
+    def save(self):
+        state = {
+            'directory': self.directory,
+            'durations': self.durations,
+            'scenarios': self.scenarios
+        }
+        tmp_file_name = self.file_name + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+            with open(tmp_file_name, 'w', encoding='utf-8') as f:
+                json.dump(state, f, separators=(',', ':'))
+            os.replace(tmp_file_name, self.file_name)
+        except OSError as e:
+            print('SublimeBehave: Could not write run history: {}'.format(e))
+
+    def set_durations(self, items, duration, results):
+        '''
+        Splits duration of a run of items among them. Every item takes as
+        long as its scenarios did, the rest is shared by those whose
+        scenarios can't be told apart (i.e. file:line of a step)
+        '''
+        # Seconds of every scenario and of every feature file
+        by_location = {}
+        for location, _, seconds in results:
+            for key in (location, location.rsplit(':', 1)[0]):
+                by_location[key] = by_location.get(key, 0) + seconds
+        durations = {x: by_location[x] for x in items if x in by_location}
+        rest = [x for x in items if x not in durations]
+        if len(rest) > 0:
+            left = max(duration - sum(durations.values()), 0)
+            for item in rest:
+                durations[item] = left / len(rest)
+        self.durations.update(durations)
+
+    def add_results(self, results, items):
+        '''
+        Replaces results of scenarios of items (feature files or scenarios,
+        all if empty) with results of a run
+        '''
+        files = set(x for x in items if ':' not in x)
+        if len(items) == 0:
+            self.scenarios.clear()
+        elif len(files) > 0:
+            # Scenarios may have been moved or removed since the last run
+            for location in list(self.scenarios):
+                if location.rsplit(':', 1)[0] in files:
+                    del self.scenarios[location]
+        for location, status, duration in results:
+            self.scenarios[location] = [status, duration]
+
+    def get_failed(self):
+        return sorted(x for x, (status, _) in self.scenarios.items()
+                      if status in self.FAILED_STATUSES)
+
+    def get_slowest(self, count):
+        '''
+        Returns list of (location, status, seconds) of the slowest scenarios
+        '''
+        return sorted(((x, status, duration) for x, (status, duration)
+                       in self.scenarios.items()),
+                      key=lambda x: -x[2])[:count]
+
+    def split_balanced(self, items, count):
+        '''
+        Splits items into at most count batches which should take about as
+        long to run, the slowest batch first
+        '''
+        # Feature files which never ran as a whole take as long as their
+        # scenarios did
+        by_file = {}
+        for location, (_, duration) in self.scenarios.items():
+            file_name = location.rsplit(':', 1)[0]
+            by_file[file_name] = by_file.get(file_name, 0) + duration
+
+        durations = {}
+        for item in items:
+            duration = self.durations.get(item)
+            if duration is None:
+                duration = by_file.get(item) if ':' not in item \
+                    else (self.scenarios.get(item) or [None, None])[1]
+            durations[item] = duration
+        known = [x for x in durations.values() if x is not None]
+        # Items that never ran take as long as an average one
+        default = sum(known) / len(known) if len(known) > 0 else 1.0
+        for item, duration in durations.items():
+            if duration is None:
+                durations[item] = default
+
+        # Longest first, every item goes to the batch which ends soonest
+        batches = [[0.0, []] for _ in range(min(count, len(items)))]
+        for item in sorted(items, key=lambda x: -durations[x]):
+            batch = min(batches, key=lambda x: x[0])
+            batch[0] += durations[item]
+            batch[1].append(item)
+        batches.sort(key=lambda x: -x[0])
+        return [x[1] for x in batches]
+
+def read_json_results(file_name):
+    '''
+    Returns list of (location, status, seconds) of scenarios in output
+    of behave's 'json' formatter. Scenarios of outlines are located by
+    their row of Examples
+    '''
+    try:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            features = json.load(f)
+    except (OSError, ValueError):
+        # behave failed before writing anything
+        return []
+
+    results = []
+    for feature in features if isinstance(features, list) else []:
+        for element in feature.get('elements', []):
+            if element.get('type') != 'scenario' or 'status' not in element:
+                continue
+            duration = sum(x.get('result', {}).get('duration', 0)
+                           for x in element.get('steps', []))
+            results.append((element['location'], element['status'],
+                            duration))
+    return results
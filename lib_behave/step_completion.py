@@ -0,0 +1,51 @@
+import bisect
+
+class StepCompletionIndex:
+    '''
+    Step definitions of every step type sorted by their (lowercased)
+    pattern, so definitions starting with given text are found with
+    a binary search. Only step types whose definitions were replaced since
+    the last update are sorted again
+    '''
+    def __init__(self):
+        # step type -> (definitions it was built from, their count,
+        #               sorted patterns, step definitions in the same order)
+        self.indices = {}
+
+    def update(self, step_defs):
+        for step_type in list(self.indices):
+            if step_type not in step_defs:
+                del self.indices[step_type]
+        for step_type, defs in list(step_defs.items()):
+            index = self.indices.get(step_type)
+            if index is not None and index[0] is defs and index[1] == len(defs):
+                continue
+            entries = sorted(((x.pattern.lower(), x) for x in defs),
+                             key=lambda x: x[0])
+            self.indices[step_type] = (defs, len(defs),
+                                       [x[0] for x in entries],
+                                       [x[1] for x in entries])
+
+    def complete(self, step_types, text, limit=100):
+        '''
+        Returns definitions of given step types whose pattern starts with
+        text (case insensitive). Generic steps are listed only once
+        '''
+        text = text.lower()
+        result = []
+        seen = set()
+        for step_type in step_types:
+            index = self.indices.get(step_type)
+            if index is None:
+                continue
+            _, _, patterns, step_defs = index
+            pos = bisect.bisect_left(patterns, text)
+            while pos < len(patterns) and len(result) < limit and \
+                    patterns[pos].startswith(text):
+                step_def = step_defs[pos]
+                location = (step_def.file_name, step_def.line)
+                if location not in seen:
+                    seen.add(location)
+                    result.append(step_def)
+                pos += 1
+        return result
@@ -0,0 +1,156 @@
+import ast
+import os
+
+FUNCTION_DEF_TYPES = tuple(getattr(ast, x)
+                           for x in ('FunctionDef', 'AsyncFunctionDef')
+                           if hasattr(ast, x))
+
+class DynamicStepsError(Exception):
+    '''
+    Raised when step definitions can't be resolved without importing step
+    modules (i.e. pattern is not a string literal)
+    '''
+    pass
+
+class StepExtractor:
+    '''
+    Extracts step definitions straight from the source of step modules
+    without importing them (and behave along with them)
+    '''
+    STEP_TYPES = ('given', 'when', 'then', 'step')
+    MATCHER_FUNCTIONS = ('use_step_matcher', 'step_matcher')
+    DEFAULT_MATCHER = 'parse'
+
+    def __init__(self, directory, steps_dir=os.path.join('features', 'steps')):
+        self.directory = directory
+        self.steps_dir = steps_dir
+
+    def get_step_files(self):
+        '''
+        Returns step modules in the order behave loads them
+        '''
+        path = os.path.join(self.directory, self.steps_dir)
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            return []
+        return [os.path.join(path, x) for x in names if x.endswith('.py')]
+
+    def extract(self, strict=True):
+        '''
+        Returns list of (step_type, pattern, file_name, line, matcher) tuples
+        in the order of registration. step_type is one of STEP_TYPES.
+        With strict=False steps which can't be resolved are skipped instead
+        of raising DynamicStepsError
+        '''
+        result = []
+        for path in self.get_step_files():
+            try:
+                result.extend(self.extract_from_file(path))
+            except DynamicStepsError:
+                if strict:
+                    raise
+        return result
+
+    def extract_from_file(self, path):
+        file_name = os.path.relpath(path, self.directory)
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), path)
+        except (OSError, SyntaxError) as e:
+            raise DynamicStepsError('Could not parse {}: {}'.format(
+                file_name, e))
+
+        matchers = self._get_matcher_changes(tree)
+        result = []
+        decorators = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, FUNCTION_DEF_TYPES) or \
+                    not node.decorator_list:
+                continue
+            # behave reports location of the function, that is its first
+            # decorator. Decorators are applied bottom-up
+            line = node.decorator_list[0].lineno
+            for decorator in reversed(node.decorator_list):
+                step_type = self._get_step_type(decorator)
+                if step_type is None:
+                    continue
+                decorators.add(decorator)
+                pattern = self._get_pattern(decorator)
+                if pattern is None:
+                    raise DynamicStepsError(
+                        'Non-literal step pattern in {}:{}'.format(
+                            file_name, decorator.lineno))
+                result.append((step_type, pattern, file_name, line,
+                               self._get_matcher_at(matchers, line)))
+
+        # given('...')(func) and alike can't be resolved
+        for node in ast.walk(tree):
+            if node not in decorators and self._get_step_type(node):
+                raise DynamicStepsError(
+                    'Dynamically registered step in {}:{}'.format(
+                        file_name, node.lineno))
+
+        result.sort(key=lambda x: x[3])
+        return result
+
+    def _get_matcher_changes(self, tree):
+        '''
+        Returns sorted list of (line, matcher) for top-level
+        use_step_matcher() calls. behave resets the matcher for every file
+        '''
+        result = []
+        for node in tree.body:
+            if not isinstance(node, ast.Expr) or \
+                    not isinstance(node.value, ast.Call) or \
+                    len(node.value.args) < 1:
+                continue
+            func = node.value.func
+            name = func.id if isinstance(func, ast.Name) else \
+                func.attr if isinstance(func, ast.Attribute) else None
+            matcher = _literal_string(node.value.args[0])
+            if name in self.MATCHER_FUNCTIONS and matcher is not None:
+                result.append((node.lineno, matcher))
+        return result
+
+    def _get_matcher_at(self, matchers, line):
+        matcher = self.DEFAULT_MATCHER
+        for matcher_line, name in matchers:
+            if matcher_line > line:
+                break
+            matcher = name
+        return matcher
+
+    def _get_step_type(self, node):
+        if not isinstance(node, ast.Call):
+            return None
+        func = node.func
+        if isinstance(func, ast.Name):
+            name = func.id
+        elif isinstance(func, ast.Attribute) and \
+                isinstance(func.value, ast.Name) and func.value.id == 'behave':
+            name = func.attr
+        else:
+            return None
+        # behave exports both @given and @Given
+        if name.lower() not in self.STEP_TYPES or \
+                name not in (name.lower(), name.capitalize()):
+            return None
+        return name.lower()
+
+    @staticmethod
+    def _get_pattern(call):
+        if len(call.args) > 0:
+            node = call.args[0]
+        else:
+            node = next((x.value for x in call.keywords
+                         if x.arg in ('step_text', 'pattern')), None)
+        return _literal_string(node)
+
+def _literal_string(node):
+    # ast.Str is gone in recent Pythons, ast.Constant is not there in old ones
+    if hasattr(ast, 'Constant') and isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if hasattr(ast, 'Str') and isinstance(node, ast.Str):
+        return node.s
+    return None
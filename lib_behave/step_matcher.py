@@ -0,0 +1,231 @@
+import re
+from functools import lru_cache
+
+# Regular expressions for types supported by parse module out of the box.
+# Anything else (i.e. types registered with register_type) matches
+# any text.
+PARSE_TYPE_PATTERNS = {
+    '': r'.+?',
+    'd': r'[-+ ]?(?:0[bB][01]+|0[oO][0-7]+|0[xX][0-9a-fA-F]+|\d+)',
+    'n': r'[-+ ]?\d{1,3}(?:[,.]\d{3})*',
+    'w': r'\w+',
+    'W': r'\W+',
+    's': r'\s+',
+    'S': r'\S+',
+    'l': r'[a-zA-Z]+',
+    'f': r'[-+ ]?\d*\.\d+',
+    'F': r'[-+ ]?\d*\.\d+',
+    'e': r'[-+ ]?\d*\.\d+[eE][-+ ]?\d+|nan|NAN|[-+ ]?inf|[-+ ]?INF',
+    'g': r'[-+ ]?\d+(?:\.\d+)?(?:[eE][-+ ]?\d+)?|nan|NAN|[-+ ]?inf|[-+ ]?INF',
+    '%': r'[-+ ]?\d+(?:\.\d+)?%',
+    'x': r'(?:0[xX])?[0-9a-fA-F]+',
+    'X': r'(?:0[xX])?[0-9a-fA-F]+',
+    'o': r'(?:0[oO])?[0-7]+',
+    'b': r'(?:0[bB])?[01]+',
+}
+
+FIELD_PATTERN = re.compile(r'\{\{|\}\}|\{([^{}]*)\}')
+# [[fill]align][sign][#][0][width][,][.precision] followed by type
+FORMAT_SPEC_PATTERN = re.compile(r'^(?:.?[<>=^])?[-+ ]?#?0?\d*,?(?:\.\d+)?(.*)$')
+CARDINALITY_SEPARATOR = r'\s*,\s*'
+
+@lru_cache(maxsize=16384)
+def compile_pattern(pattern, matcher='parse'):
+    '''
+    Compiles step pattern to a regular expression which matches the same
+    step texts as given behave matcher. Returns None for invalid patterns
+    '''
+    try:
+        if matcher == 're':
+            # behave's SimplifiedRegexMatcher adds begin/end markers
+            return re.compile('^{}$'.format(pattern))
+        if matcher == 're0':
+            # Cucumber style, markers are up to the pattern
+            return re.compile(pattern)
+        return re.compile(_parse_to_regex(pattern, matcher == 'cfparse'),
+                          re.IGNORECASE | re.DOTALL)
+    except re.error:
+        return None
+
+def _parse_to_regex(pattern, with_cardinality):
+    result = []
+    pos = 0
+    for match in FIELD_PATTERN.finditer(pattern):
+        result.append(re.escape(pattern[pos:match.start()]))
+        pos = match.end()
+        token = match.group(0)
+        if token in ('{{', '}}'):
+            result.append(re.escape(token[0]))
+            continue
+        field = match.group(1)
+        spec = field.split(':', 1)[1] if ':' in field else ''
+        result.append(_field_to_regex(spec, with_cardinality))
+    result.append(re.escape(pattern[pos:]))
+    return '^' + ''.join(result) + '$'
+
+def _field_to_regex(spec, with_cardinality):
+    type_name = FORMAT_SPEC_PATTERN.match(spec).group(1)
+    cardinality = ''
+    if with_cardinality and type_name[-1:] in ('?', '*', '+'):
+        cardinality = type_name[-1]
+        type_name = type_name[:-1]
+
+    regex = '(?:{})'.format(PARSE_TYPE_PATTERNS.get(type_name, r'.+?'))
+    if cardinality == '?':
+        return regex + '?'
+    if cardinality in ('*', '+'):
+        regex = '{0}(?:{1}{0})*'.format(regex, CARDINALITY_SEPARATOR)
+        return '(?:{})?'.format(regex) if cardinality == '*' else regex
+    return regex
+
+# Literal word of a regex followed by a plain space (not quantified)
+REGEX_LEADING_WORD_PATTERN = re.compile(r'([\w\'"-]+) (?![*+?{])')
+PARSE_LEADING_WORD_PATTERN = re.compile(r'(\S+)\s')
+
+def get_leading_words(pattern, matcher='parse'):
+    '''
+    Returns lowercased literal words every text matching the pattern
+    starts with
+    '''
+    if matcher in ('re', 're0'):
+        if '|' in pattern:
+            return []
+        literal = pattern[1:] if pattern.startswith('^') else pattern
+        word_pattern = REGEX_LEADING_WORD_PATTERN
+    else:
+        literal = FIELD_PATTERN.split(pattern, 1)[0]
+        if len(literal) == len(pattern):
+            # no fields, the whole text must be equal to the pattern
+            literal += ' '
+        word_pattern = PARSE_LEADING_WORD_PATTERN
+
+    words = []
+    pos = 0
+    while True:
+        match = word_pattern.match(literal, pos)
+        if not match:
+            return words
+        words.append(match.group(1).lower())
+        pos = match.end()
+
+def get_required_literal(pattern, matcher='parse'):
+    '''
+    Returns lowercased longest literal fragment every text matching
+    the pattern contains
+    '''
+    if matcher in ('re', 're0'):
+        # not worth parsing regular expressions
+        return ''
+    return max((x.lower() for x in FIELD_PATTERN.split(pattern)[::2]),
+               key=len)
+
+def get_required_words(pattern, matcher='parse'):
+    '''
+    Returns lowercased whole words which every text matching the pattern has
+    after splitting on whitespace
+    '''
+    if matcher in ('re', 're0'):
+        return set()
+    chunks = FIELD_PATTERN.split(pattern)[::2]
+    result = set()
+    for index, chunk in enumerate(chunks):
+        words = chunk.lower().split()
+        # Words at the edges can be glued to field values
+        if index > 0 and chunk and not chunk[0].isspace():
+            words = words[1:]
+        if index < len(chunks) - 1 and chunk and not chunk[-1].isspace():
+            words = words[:-1]
+        result.update(words)
+    return result
+
+class _TrieNode:
+    __slots__ = ('children', 'entries', 'by_word')
+
+    def __init__(self):
+        self.children = {}
+        # (index, required literal, regex, step_def) whose literal words
+        # end at this node...
+        self.entries = []
+        # ...and the same entries keyed by the rarest word they require
+        self.by_word = {}
+
+class StepMatcher:
+    '''
+    Matches step texts against step definitions in the same order behave does.
+    Definitions are kept in a trie of their leading literal words and
+    at every node further keyed by the rarest whole word they require, so
+    only a handful of regular expressions are tried for every text
+    '''
+    def __init__(self, step_defs):
+        self.roots = {}
+        for step_type, defs in step_defs.items():
+            self.roots[step_type] = self._build_trie(defs)
+
+    @staticmethod
+    def _build_trie(step_defs):
+        entries = []
+        frequency = {}
+        for index, step_def in enumerate(step_defs):
+            regex = compile_pattern(step_def.pattern, step_def.matcher)
+            if regex is None:
+                continue
+            words = get_required_words(step_def.pattern, step_def.matcher)
+            for word in words:
+                frequency[word] = frequency.get(word, 0) + 1
+            entries.append((words, (index,
+                                    get_required_literal(step_def.pattern,
+                                                         step_def.matcher),
+                                    regex, step_def)))
+
+        root = _TrieNode()
+        for words, entry in entries:
+            step_def = entry[3]
+            node = root
+            leading_words = get_leading_words(step_def.pattern,
+                                              step_def.matcher)
+            for word in leading_words:
+                child = node.children.get(word)
+                if child is None:
+                    child = node.children[word] = _TrieNode()
+                node = child
+            # Leading words are already used for the trie
+            words = words.difference(leading_words)
+            if words:
+                word = min(words, key=lambda x: (frequency[x], x))
+                node.by_word.setdefault(word, []).append(entry)
+            else:
+                node.entries.append(entry)
+        return root
+
+    def _get_candidate_lists(self, step_type, words):
+        '''
+        Yields lists of (index, required literal, regex, step_def), each list
+        sorted by definition index
+        '''
+        node = self.roots.get(step_type)
+        unique_words = set(words)
+        depth = 0
+        while node is not None:
+            yield node.entries
+            if node.by_word:
+                for word in unique_words:
+                    entries = node.by_word.get(word)
+                    if entries is not None:
+                        yield entries
+            if depth == len(words):
+                break
+            node = node.children.get(words[depth])
+            depth += 1
+
+    def match(self, step_type, text):
+        lowered = text.lower()
+        best = None
+        for entries in self._get_candidate_lists(step_type, lowered.split()):
+            for entry in entries:
+                # Only the first matching definition counts
+                if best is not None and entry[0] > best[0]:
+                    break
+                if entry[1] in lowered and entry[2].match(text):
+                    best = entry
+                    break
+        return best[3] if best is not None else None
@@ -1,9 +1,16 @@
 import re
-import sublime
+import sys
 import json
-from collections import defaultdict
+import itertools
 
 from .behave_command import BehaveCommand
+from .host import load_settings, status_message
+from .step_extractor import StepExtractor, DynamicStepsError
+from .step_completion import StepCompletionIndex
+from .step_matcher import StepMatcher
+from .timing import timed_operation, timed_phase, set_count
+
+_versions = itertools.count(1)
 
 class StepDefinition:
     STEP_TYPE = {
@@ -13,54 +20,129 @@ class StepDefinition:
         'generic': 4
     }
 
-    def __init__(self, step_type, phrase, file_name, line):
+    __slots__ = ('step_type', 'phrase', 'file_name', 'line', 'matcher')
+
+    def __init__(self, step_type, phrase, file_name, line, matcher='parse'):
         self.step_type = StepDefinition.STEP_TYPE[step_type]
         self.phrase = phrase
-        self.file_name = file_name
+        # Shared with step usages referring to the definition
+        self.file_name = sys.intern(file_name)
         self.line = int(line)
+        self.matcher = matcher
+
+    @property
+    def pattern(self):
+        # phrase starts with step type keyword
+        return self.phrase.split(' ', 1)[-1]
 
     def __repr__(self):
         return json.dumps(self,
-                  default=lambda o: o.__dict__,
+                  default=lambda o: {x: getattr(o, x) for x in o.__slots__},
                   sort_keys=True, indent=4)
 
+class StepList:
+    '''
+    Flattened (and possibly filtered) definitions along with items for
+    Sublime's Quick Panel, index of an item is index of its definition
+    '''
+    def __init__(self, step_defs):
+        self.step_defs = step_defs
+        self.items = [[x.phrase, '{}:{}'.format(x.file_name, x.line)]
+                      for x in step_defs]
+
+    def __len__(self):
+        return len(self.step_defs)
+
+    def get(self, index):
+        if 0 <= index < len(self.step_defs):
+            return self.step_defs[index]
+        return None
+
 class StepRegistry:
+    '''
+    Definitions are published as a whole new dict with a single reference
+    swap, neither the dict, its lists nor definitions are modified after.
+    Readers (on any thread) take a reference and never see a half-built
+    index
+    '''
     def __init__(self):
-        self.step_defs = defaultdict(list)
+        # step type -> list of StepDefinition
+        self.step_defs = {}
+        self.version = next(_versions)
         self.directory = ''
         # dont include 'GENERIC' steps since behave does appends them to every other
         self.step_type_header = re.compile(r'(GIVEN|WHEN|THEN) STEP DEFINITIONS\[(\d+)\]:')
         self.step_pattern = re.compile(r'\s{2}(.*\s)\s*# (.*):(\d+)')
         self.order = ['given', 'then', 'when']
+        # (step_defs, StepMatcher) built on first use
+        self._matcher = None
+        self._completion_index = StepCompletionIndex()
+        # (step_defs, {(step_type, file_name): StepList}) built on first use
+        self._step_lists = None
 
     def get_count(self):
         return len(self.step_defs)
 
     def update_definitions(self, directory):
-        sublime.status_message('Behave: Updating index of step definitions')
-        self._update_definitions(directory)
+        status_message('Behave: Updating index of step definitions')
+        settings = load_settings()
+        with timed_operation('Update step definitions'):
+            self._update_definitions(
+                directory, settings.get('static_step_definitions', False))
+            set_count('step definitions',
+                      sum(len(x) for x in self.step_defs.values()))
         self.directory = directory
-        sublime.status_message('Behave: Done updating index of step definitions')
+        status_message('Behave: Done updating index of step definitions')
+
+    def _update_definitions(self, directory, static=False):
+        if static:
+            try:
+                with timed_phase('read step modules'):
+                    self._update_definitions_static(directory)
+                return
+            except DynamicStepsError as e:
+                print('SublimeBehave: {}, falling back to behave'.format(e))
 
-    def _update_definitions(self, directory):
         args = ['--dry-run',
                 '-f', 'steps',
                 '--no-summary',
                 '--no-snippets',
                 '--exclude=.*']
 
-        out = BehaveCommand().run(directory, *args)
+        with timed_phase('read step matchers'):
+            matchers = self._read_matchers(directory)
+        lines = BehaveCommand().run_lines(directory, *args)
+        new_step_defs = {}
+        with timed_phase('parse step definitions'):
+            # Publish every step type as soon as its section is parsed,
+            # complete with matchers
+            for current_type, step_defs in self._parse_definitions(lines):
+                for step_def in step_defs:
+                    step_def.matcher = matchers.get(
+                        (step_def.file_name, step_def.line), step_def.matcher)
+                new_step_defs[current_type] = step_defs
+                published = dict(self.step_defs)
+                published[current_type] = step_defs
+                self._publish(published)
+        self._publish(new_step_defs)
+        #print(self.step_defs)
 
+    def _parse_definitions(self, lines):
+        '''
+        Parses output of 'steps' formatter, yields (step_type, definitions)
+        for every completed section
+        '''
         current_type = ''
         num_steps = 0
-        self.step_defs.clear()
+        step_defs = []
 
-        for line in iter(out.splitlines()):
+        for line in lines:
             if len(current_type) == 0:
                 match = self.step_type_header.search(line)
                 if match:
                     current_type = match.group(1).lower()
                     num_steps = int(match.group(2))
+                    step_defs = []
             elif num_steps > 0:
                 num_steps -= 1
                 match = self.step_pattern.search(line)
@@ -68,14 +150,84 @@ class StepRegistry:
                     continue
                 # remove first phrase (given, when, then) - we dont need it
                 phrase = match.group(1).strip() #.split(' ', 1)[1]
-                self.step_defs[current_type].append(StepDefinition(current_type,
-                                                                   phrase, 
-                                                                   match.group(2),
-                                                                   match.group(3)))
+                step_defs.append(StepDefinition(current_type,
+                                                phrase, 
+                                                match.group(2),
+                                                match.group(3)))
             else:
+                yield current_type, step_defs
                 current_type = ''
 
-        #print(self.step_defs)
+        if len(current_type) > 0:
+            yield current_type, step_defs
+
+    def _read_matchers(self, directory):
+        '''
+        behave's output doesn't tell which step matcher is used by definition,
+        try to find it out from step modules. Returns {(file_name, line):
+        matcher}
+        '''
+        return {(x[2], x[3]): x[4]
+                for x in StepExtractor(directory).extract(strict=False)}
+
+    def _update_definitions_static(self, directory):
+        step_defs = StepExtractor(directory).extract()
+        generic_defs = [x for x in step_defs if x[0] == 'step']
+
+        new_step_defs = {}
+        # Mimic behave's 'steps' formatter which appends generic steps
+        # to every other step type
+        for current_type in self.order:
+            for _, pattern, file_name, line, matcher in \
+                    [x for x in step_defs if x[0] == current_type] + generic_defs:
+                phrase = '{} {}'.format(current_type.capitalize(), pattern)
+                new_step_defs.setdefault(current_type, []).append(
+                    StepDefinition(current_type, phrase, file_name, line,
+                                   matcher))
+        self._publish(new_step_defs)
+
+    def dump_state(self):
+        return {
+            'directory': self.directory,
+            'step_defs': {
+                step_type: [[x.phrase, x.file_name, x.line, x.matcher]
+                            for x in step_defs]
+                for step_type, step_defs in self.step_defs.items()
+            }
+        }
+
+    def load_state(self, state):
+        self._publish({
+            step_type: [StepDefinition(step_type, *x) for x in step_defs]
+            for step_type, step_defs in state['step_defs'].items()
+        })
+        self.directory = state['directory']
+
+    def _publish(self, step_defs):
+        self.step_defs = step_defs
+        self.version = next(_versions)
+
+    @property
+    def matcher(self):
+        '''
+        StepMatcher for current definitions, built on first use
+        '''
+        step_defs = self.step_defs
+        matcher = self._matcher
+        if matcher is None or matcher[0] is not step_defs:
+            with timed_phase('build step matcher'):
+                matcher = (step_defs, StepMatcher(step_defs))
+            self._matcher = matcher
+        return matcher[1]
+
+    @property
+    def completion_index(self):
+        '''
+        StepCompletionIndex for current definitions, step types which
+        changed since last use are indexed again
+        '''
+        self._completion_index.update(self.step_defs)
+        return self._completion_index
 
     def get_definition_by_location(self, step_type, file_name, line):
         step_def = self.step_defs.get(step_type)
@@ -85,30 +237,45 @@ class StepRegistry:
                      if x.line == line and x.file_name == file_name), None)
 
     def get_definition_by_phrase(self, step_type, phrase):
-        step_def = self.step_defs.get(step_type)
-        if step_def is None:
-            return None
-        return next((x for x in step_def
-                     if x.phrase.find(phrase[1:-1]) != -1), None)
+        '''
+        Returns definition matching step text (without the keyword)
+        '''
+        return self.matcher.match(step_type, phrase)
 
-    def get_definition_by_index(self, index):
-        tmp = 0
-        for step_type in self.order:
-            list_by_type = self.step_defs.get(step_type)
-            if list_by_type is None:
-                continue
-            if index - tmp < len(list_by_type):
-                return list_by_type[index - tmp]
+    def get_step_list(self, step_type=None, file_name=None):
+        '''
+        Returns StepList of definitions of given step type and/or file (all
+        by default) in the order of iteration. It's built once per change
+        of definitions
+        '''
+        step_defs = self.step_defs
+        step_lists = self._step_lists
+        if step_lists is None or step_lists[0] is not step_defs:
+            step_lists = (step_defs, {})
+            self._step_lists = step_lists
+        key = (step_type, file_name)
+        step_list = step_lists[1].get(key)
+        if step_list is None:
+            if step_type is None:
+                items = list(self._iter(step_defs))
             else:
-                tmp = tmp + len(list_by_type)
-        return None
+                items = list(step_defs.get(step_type, []))
+            if file_name is not None:
+                items = [x for x in items if x.file_name == file_name]
+            step_list = StepList(items)
+            step_lists[1][key] = step_list
+        return step_list
+
+    def get_definition_by_index(self, index):
+        return self.get_step_list().get(index)
 
     def __iter__(self):
+        return self._iter(self.step_defs)
+
+    def _iter(self, step_defs):
         for step_type in self.order:
-            list_by_type = self.step_defs.get(step_type)
+            list_by_type = step_defs.get(step_type)
             if list_by_type is None:
                 continue
             for step_def in list_by_type:
                 yield step_def
-
-step_registry = StepRegistry()
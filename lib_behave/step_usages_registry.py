@@ -1,28 +1,149 @@
 ﻿import re
-import sublime
+import os
+import sys
 import json
+import itertools
+import multiprocessing
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from .behave_command import BehaveCommand
+from .behave_config import get_feature_files
+from .gherkin_parser import GherkinParser
+from .host import load_settings, status_message
+from .timing import timed_operation, timed_phase, set_count
+
+# Versions are unique across registries, so a registry created again for the
+# same project never repeats a version views may have cached
+_versions = itertools.count(1)
+# How often (seconds) partial results are published while indexing
+PUBLISH_INTERVAL = 0.5
+# Characters of feature paths passed to a single behave process. Windows
+# limits command lines to 32767 characters, 8191 if behave is a batch file
+MAX_PATHS_LENGTH = 8000
+
+def split_paths(paths, max_length=MAX_PATHS_LENGTH):
+    '''
+    Splits paths into chunks short enough for a single command line
+    '''
+    chunks = []
+    length = 0
+    for path in paths:
+        if len(chunks) == 0 or length + len(path) + 1 > max_length:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(path)
+        length += len(path) + 1
+    return chunks
 
 class StepUsage:
+    # There's one for every step in the project, keep them small. File names
+    # are interned so all usages of a file share a single string
+    __slots__ = ('file_name', 'line', 'def_file_name', 'def_line')
+
     def __init__(self, file_name, line, def_file_name, def_line):
-        self.file_name = file_name
+        self.file_name = sys.intern(file_name)
         self.line = line
-        self.def_file_name = def_file_name
+        self.def_file_name = sys.intern(def_file_name)
         self.def_line = def_line
 
     def __repr__(self):
         return json.dumps(self,
-                  default=lambda o: o.__dict__,
+                  default=lambda o: {x: getattr(o, x) for x in o.__slots__},
                   sort_keys=True, indent=4)
 
+class StepUsagesSnapshot:
+    '''
+    Index of step usages, never modified once published. Readers take
+    a reference to it and may use it as long as they like
+    '''
+    def __init__(self, step_usages, usages_by_location, usages_by_definition):
+        # Lets views tell if what they cached is still valid
+        self.version = next(_versions)
+        # file_name -> list of StepUsage
+        self.step_usages = step_usages
+        # file_name -> {line: first StepUsage at that line}
+        self.usages_by_location = usages_by_location
+        # (def_file_name, def_line) -> {file_name: list of StepUsage}
+        self.usages_by_definition = usages_by_definition
+
+class _SnapshotBuilder:
+    '''
+    Builds a new snapshot off to the side of a published one. Containers
+    are copied only when changed, everything else is shared
+    '''
+    def __init__(self, snapshot=None):
+        if snapshot is None:
+            snapshot = StepUsagesSnapshot({}, {}, {})
+        self.step_usages = dict(snapshot.step_usages)
+        self.usages_by_location = dict(snapshot.usages_by_location)
+        self.usages_by_definition = dict(snapshot.usages_by_definition)
+        # Definitions whose dict of usages is a copy already
+        self.copied = set()
+
+    def remove(self, feature_files):
+        for feature_file in feature_files:
+            usages = self.step_usages.pop(feature_file, None)
+            if usages is None:
+                continue
+            self.usages_by_location.pop(feature_file, None)
+            for key in set((x.def_file_name, x.def_line) for x in usages):
+                by_file = self._get_by_file(key, create=False)
+                if by_file is None:
+                    continue
+                by_file.pop(feature_file, None)
+                if len(by_file) == 0:
+                    del self.usages_by_definition[key]
+
+    def add(self, feature_file, usages):
+        '''
+        Sets usages of a feature file. The list must not be modified after
+        '''
+        self.remove([feature_file])
+        self.step_usages[feature_file] = usages
+        by_line = {}
+        by_definition = {}
+        for usage in usages:
+            by_line.setdefault(usage.line, usage)
+            by_definition.setdefault((usage.def_file_name, usage.def_line),
+                                     []).append(usage)
+        self.usages_by_location[feature_file] = by_line
+        for key, def_usages in by_definition.items():
+            self._get_by_file(key, create=True)[feature_file] = def_usages
+
+    def build(self):
+        '''
+        Returns the new snapshot, the builder must not be used after that
+        '''
+        return StepUsagesSnapshot(self.step_usages, self.usages_by_location,
+                                  self.usages_by_definition)
+
+    def _get_by_file(self, key, create):
+        by_file = self.usages_by_definition.get(key)
+        if by_file is not None and key in self.copied:
+            return by_file
+        if by_file is None and not create:
+            return None
+        by_file = dict(by_file) if by_file is not None else {}
+        self.usages_by_definition[key] = by_file
+        self.copied.add(key)
+        return by_file
+
 class StepUsagesRegistry:
-    def __init__(self):
-        self.step_usages = defaultdict(list)
+    '''
+    Usages are published as a whole new snapshot with a single reference
+    swap, so readers (on any thread) never block nor see it being modified.
+    While updating, files indexed before keep their previous usages until
+    their new ones are complete
+    '''
+    def __init__(self, step_registry):
+        # Definitions of the same project, used by native step matching
+        self.step_registry = step_registry
+        self.snapshot = StepUsagesSnapshot({}, {}, {})
         self.directory = ''
         self.step_def_pattern = re.compile(
-            r'^@(?:given|when|then)\((?:.*)\)\s*# (.*):(\d+)$')
+            r'^@(?:given|when|then|step)\((?:.*)\)\s*# (.*):(\d+)$')
         self.undefined_pattern = re.compile(r'^UNDEFINED STEPS\[\d+\]:$')
         self.unused_pattern = re.compile(r'^UNUSED STEP DEFINITIONS\[\d+\]:$')
         self.step_usage_pattern = re.compile(r'^\s{2}(?:.*)\s*# (.*):(\d+)$')
@@ -35,26 +156,112 @@ class StepUsagesRegistry:
 
     def update_step_usages(self, directory, feature_files=[]):
         s = StepUsagesRegistry.get_status_message(feature_files)
-        sublime.status_message('Behave: Updating index of step usages ' + s)
-        self._update_step_usages(directory, feature_files)
+        status_message('Behave: Updating index of step usages ' + s)
+        settings = load_settings()
+        with timed_operation('Update step usages'):
+            if settings.get('native_step_matching', False):
+                self._update_step_usages_native(directory, feature_files,
+                                                self.step_registry)
+            else:
+                shards = settings.get('index_shards', 1)
+                if shards <= 0:
+                    shards = multiprocessing.cpu_count()
+                self._update_step_usages(directory, feature_files, shards)
+            set_count('feature files', len(self.step_usages))
+            set_count('step usages',
+                      sum(len(x) for x in self.step_usages.values()))
         self.directory = directory
-        sublime.status_message(
+        status_message(
             'Behave: Done updating index of step usages ' + s)
 
-    def _update_step_usages(self, directory, feature_files=[]):
+    def _update_step_usages(self, directory, feature_files=[], shards=1):
         args = ['--dry-run',
                 '--no-summary',
                 '--no-snippets', 
-                '-f', 'steps.usage'] + feature_files
-        out = BehaveCommand().run(directory, *args)
+                '-f', 'steps.usage']
+        if len(feature_files) == 0 and shards > 1:
+            all_files = StepUsagesRegistry.get_feature_files(directory)
+            if len(all_files) >= shards:
+                with timed_phase('behave shards'):
+                    self._run_shards(directory, args, all_files, shards)
+                return
+        elif len(split_paths(feature_files)) > 1:
+            # Too many for a single command line
+            with timed_phase('behave shards'):
+                self._run_shards(directory, args, feature_files,
+                                 max(shards, 1), full=False)
+            return
 
-        if len(feature_files) > 0:
-            # remove entries corresponding to feature_files
-            for feature_file in (x for x in feature_files
-                                 if self.step_usages.get(x) is not None):
-                del self.step_usages[feature_file]
-        else:  # remove all entries
-            self.step_usages.clear()
+        # Usages of a file are complete only at the end of the output, until
+        # then only files not indexed yet are published (every now and then)
+        known_files = set(self.step_usages)
+        step_usages = defaultdict(list)
+        lines = BehaveCommand().run_lines(directory, *(args + feature_files))
+        with timed_phase('parse step usages'):
+            last_publish = time.time()
+            for usages in self._parse_step_usages(lines):
+                for usage in usages:
+                    step_usages[usage.file_name].append(usage)
+                if time.time() - last_publish > PUBLISH_INTERVAL:
+                    new_files = [x for x in step_usages if x not in known_files]
+                    if len(new_files) > 0:
+                        self._replace_step_usages(
+                            {x: list(step_usages[x]) for x in new_files},
+                            new_files)
+                    last_publish = time.time()
+            self._replace_step_usages(step_usages, feature_files,
+                                      full=len(feature_files) == 0)
+
+    def _run_shards(self, directory, args, feature_files, shards,
+                    full=True):
+        '''
+        Splits feature files into shards of similar size and runs a dry-run
+        for each shard concurrently. Shards too long for a command line are
+        run in parts. Usages of every part are published as soon as it
+        completes. Unless full, usages of other files are kept
+        '''
+        sizes = {}
+        for feature_file in feature_files:
+            try:
+                sizes[feature_file] = os.path.getsize(
+                    os.path.join(directory, feature_file))
+            except OSError:
+                sizes[feature_file] = 0
+        # Largest files first, each to the least loaded shard
+        buckets = [[0, []] for _ in range(shards)]
+        for feature_file in sorted(feature_files, key=lambda x: -sizes[x]):
+            bucket = min(buckets, key=lambda x: x[0])
+            bucket[0] += sizes[feature_file]
+            bucket[1].append(feature_file)
+
+        def run_shard(files):
+            # Shards must run in separate processes, not the shared worker
+            lines = BehaveCommand().run_lines(directory, *(args + files),
+                                              use_worker=False)
+            step_usages = defaultdict(list)
+            for usages in self._parse_step_usages(lines):
+                for usage in usages:
+                    step_usages[usage.file_name].append(usage)
+            return files, step_usages
+
+        parts = [x for bucket in buckets
+                 for x in split_paths(sorted(bucket[1]))]
+        with ThreadPoolExecutor(max_workers=shards) as executor:
+            futures = [executor.submit(run_shard, x) for x in parts]
+            for future in as_completed(futures):
+                files, step_usages = future.result()
+                self._replace_step_usages(step_usages, files)
+
+        if full:
+            stale_files = set(self.step_usages).difference(feature_files)
+            self.remove_step_usages(stale_files)
+
+    def _parse_step_usages(self, lines):
+        '''
+        Parses output of 'steps.usage' formatter, yields list of StepUsage
+        for every completed section
+        '''
+        step_usages = []
 
         class ParserState:
             section_lookup = 1  # looking for @step or UNDEFINED section
@@ -63,7 +270,7 @@ class StepUsagesRegistry:
             skip_section = 4
         parser_state = ParserState.section_lookup
 
-        for line in iter(out.splitlines()):
+        for line in lines:
             if parser_state is ParserState.section_lookup:
                 match = self.step_def_pattern.search(line) # check if it's @step('')
                 if match:
@@ -81,47 +288,145 @@ class StepUsagesRegistry:
             elif parser_state is ParserState.step_usage_lookup:
                 if len(line.strip()) == 0:
                     parser_state = ParserState.section_lookup
+                    yield step_usages
+                    step_usages = []
                 else:
                     match = self.step_usage_pattern.search(line)
                     if match:
-                        key = match.group(1)
-                        self.step_usages[key].append(StepUsage(key, 
-                                                               int(match.group(2)),
-                                                               def_file_name, 
-                                                               def_line_no))
+                        step_usages.append(StepUsage(match.group(1),
+                                                     int(match.group(2)),
+                                                     def_file_name,
+                                                     def_line_no))
             elif parser_state is ParserState.undefined_lookup:
                 if len(line.strip()) == 0:
                     parser_state = ParserState.section_lookup
+                    yield step_usages
+                    step_usages = []
                 else:
                     match = self.step_usage_pattern.search(line)
                     if match:
                         # add undefined step usage
-                        key = match.group(1)
-                        self.step_usages[key].append(StepUsage(key,
-                                                               int(match.group(2)),
-                                                               '', -1))
+                        step_usages.append(StepUsage(match.group(1),
+                                                     int(match.group(2)),
+                                                     '', -1))
             elif parser_state is ParserState.skip_section:
                 if len(line.strip()) == 0:
                     parser_state = ParserState.section_lookup
 
-        # print(self.step_usages)
+        if len(step_usages) > 0:
+            yield step_usages
+
+    @staticmethod
+    def get_feature_files(directory):
+        '''
+        Feature files behave runs, as configured by its paths option
+        '''
+        return get_feature_files(directory)
+
+    def _update_step_usages_native(self, directory, feature_files, registry):
+        '''
+        Same as _update_step_usages but parses feature files and matches
+        steps in-process instead of running behave
+        '''
+        all_files = len(feature_files) == 0
+        if all_files:
+            feature_files = StepUsagesRegistry.get_feature_files(directory)
+
+        parser = GherkinParser()
+        matcher = registry.matcher
+        matched = {}
+        last_publish = time.time()
+        for feature_file in feature_files:
+            with timed_phase('parse feature files'):
+                steps = parser.parse(os.path.join(directory, feature_file))
+            usages = []
+            seen = set()
+            with timed_phase('match steps'):
+                for step in steps:
+                    for text in step.texts():
+                        step_def = matcher.match(step.step_type, text)
+                        key = (step.line, step_def.file_name, step_def.line) \
+                            if step_def else (step.line, '', -1)
+                        if key not in seen:
+                            seen.add(key)
+                            usages.append(StepUsage(feature_file, *key))
+            matched[feature_file] = usages
+            # Publish matched files every now and then
+            if time.time() - last_publish > PUBLISH_INTERVAL:
+                self._replace_step_usages(matched, list(matched))
+                matched = {}
+                last_publish = time.time()
+        if len(matched) > 0:
+            self._replace_step_usages(matched, list(matched))
+
+        if all_files:
+            self.remove_step_usages(
+                set(self.step_usages).difference(feature_files))
+
+    def _replace_step_usages(self, step_usages, feature_files, full=False):
+        '''
+        Replaces entries of feature_files with step_usages. If full, all
+        entries are replaced
+        '''
+        if full:
+            # Built from scratch, the old snapshot stays in use meanwhile
+            builder = _SnapshotBuilder()
+        else:
+            builder = _SnapshotBuilder(self.snapshot)
+            builder.remove(feature_files)
+        for feature_file, usages in step_usages.items():
+            if len(usages) > 0:
+                builder.add(feature_file, usages)
+        self.snapshot = builder.build()
+
+    def remove_step_usages(self, feature_files):
+        feature_files = [x for x in feature_files if x in self.step_usages]
+        if len(feature_files) > 0:
+            builder = _SnapshotBuilder(self.snapshot)
+            builder.remove(feature_files)
+            self.snapshot = builder.build()
+
+    @property
+    def step_usages(self):
+        '''
+        file_name -> list of StepUsage, must not be modified
+        '''
+        return self.snapshot.step_usages
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def dump_state(self):
+        return {
+            'directory': self.directory,
+            'step_usages': {
+                file_name: [[x.line, x.def_file_name, x.def_line]
+                            for x in usages]
+                for file_name, usages in self.step_usages.items()
+            }
+        }
+
+    def load_state(self, state):
+        self._replace_step_usages({
+            file_name: [StepUsage(file_name, *x) for x in usages]
+            for file_name, usages in state['step_usages'].items()
+        }, [], full=True)
+        self.directory = state['directory']
 
     def get_undefined_step_usages(self, file_name):
-        return ((x.file_name, x.line) for x in self.step_usages[file_name]
+        return ((x.file_name, x.line) for x in self.step_usages.get(file_name, [])
                 if x.def_line == -1)
 
     def get_step_definition(self, file_name, line_no):
-        l = self.step_usages.get(file_name)
-        if l is None:
-            return None
-        step_usage = next((x for x in l if x.line == line_no), None)
+        by_line = self.snapshot.usages_by_location.get(file_name)
+        step_usage = by_line.get(line_no) if by_line is not None else None
         if step_usage is None:
             return None
         return (step_usage.def_file_name, step_usage.def_line)
 
     def get_step_references(self, file_name, line_no):
-        return [(u.file_name, u.line) for values in self.step_usages.values() 
-                                      for u in values
-                if u.def_file_name == file_name and u.def_line == line_no]
-
-step_usages_registry = StepUsagesRegistry()
+        by_file = self.snapshot.usages_by_definition.get((file_name, line_no),
+                                                         {})
+        return [(u.file_name, u.line) for usages in by_file.values()
+                                      for u in usages]
@@ -0,0 +1,177 @@
+import sys
+import time
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from .host import load_settings
+
+class Operation:
+    '''
+    Single timed operation (i.e. a command) split into named phases.
+    Time of a phase doesn't include time of phases nested in it
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.duration = 0
+        # path of phase names (outermost first) -> seconds
+        self.phases = OrderedDict()
+        # item name -> count
+        self.counts = OrderedDict()
+        self.error = None
+
+    def add_phase(self, path, seconds):
+        self.phases[path] = self.phases.get(path, 0) + seconds
+
+    def set_count(self, name, count):
+        self.counts[name] = count
+
+    def format(self):
+        lines = ['{} {:<40} {:10.1f} ms{}'.format(
+            time.strftime('%H:%M:%S', time.localtime(self.start)),
+            self.name, self.duration * 1000,
+            ' (failed)' if self.error else '')]
+        for path, seconds in self.phases.items():
+            name = '  ' * len(path) + path[-1]
+            lines.append('  {:<46} {:10.1f} ms'.format(name, seconds * 1000))
+        for name, count in self.counts.items():
+            lines.append('    {:<44} {:10}'.format(name, count))
+        return '\n'.join(lines)
+
+class OperationLog:
+    '''
+    Ring buffer of the most recent operations
+    '''
+    def __init__(self, size=100):
+        self.lock = threading.Lock()
+        self.operations = deque(maxlen=size)
+
+    def add(self, operation):
+        with self.lock:
+            self.operations.append(operation)
+
+    def recent(self, count):
+        with self.lock:
+            return list(self.operations)[-count:][::-1]
+
+operation_log = OperationLog()
+
+class _Frame:
+    def __init__(self, operation, path):
+        self.operation = operation
+        self.path = path
+        self.start = time.time()
+        # Time spent in nested phases
+        self.nested = 0
+
+_state = threading.local()
+
+def _get_stack():
+    stack = getattr(_state, 'stack', None)
+    if stack is None:
+        stack = _state.stack = []
+    return stack
+
+@contextmanager
+def timed_operation(name):
+    '''
+    Records an operation in operation_log. Nested in another operation it's
+    recorded as a phase of that one
+    '''
+    stack = _get_stack()
+    if stack:
+        with timed_phase(name) as operation:
+            yield operation
+        return
+
+    operation = Operation(name)
+    stack.append(_Frame(operation, ()))
+    try:
+        yield operation
+    except Exception as e:
+        operation.error = e
+        raise
+    finally:
+        stack.pop()
+        operation.duration = time.time() - operation.start
+        operation_log.add(operation)
+        settings = load_settings()
+        if settings.get('log_timings', False):
+            print('SublimeBehave: ' + operation.format())
+
+@contextmanager
+def timed_phase(name):
+    '''
+    Adds time spent inside to the current operation (if any)
+    '''
+    stack = _get_stack()
+    if not stack:
+        yield None
+        return
+
+    frame = _Frame(stack[-1].operation, stack[-1].path + (name,))
+    # Keep phases in the order they started
+    frame.operation.add_phase(frame.path, 0)
+    stack.append(frame)
+    try:
+        yield frame.operation
+    finally:
+        stack.pop()
+        elapsed = time.time() - frame.start
+        frame.operation.add_phase(frame.path, elapsed - frame.nested)
+        stack[-1].nested += elapsed
+
+def timed(name):
+    '''
+    Decorator running the function as timed operation
+    '''
+    def decorator(fun):
+        @wraps(fun)
+        def wrapper(*args, **kwargs):
+            with timed_operation(name):
+                return fun(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def add_phase(name, seconds):
+    '''
+    Adds time measured by the caller to the current operation (if any), as
+    if it was a nested phase
+    '''
+    stack = _get_stack()
+    if stack:
+        stack[-1].operation.add_phase(stack[-1].path + (name,), seconds)
+        stack[-1].nested += seconds
+
+def set_count(name, count):
+    stack = _get_stack()
+    if stack:
+        stack[-1].operation.set_count(name, count)
+
+def get_size(obj):
+    '''
+    Approximate memory size (in bytes) of an object and everything it refers
+    to through containers, attributes and slots
+    '''
+    seen = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            pending.extend(obj)
+        if hasattr(obj, '__dict__'):
+            pending.append(obj.__dict__)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                pending.append(getattr(obj, slot))
+    return size
@@ -1,62 +1,150 @@
 import sublime
 import sublime_plugin
 import os
-import re
 
-from .step_registry import step_registry
-from .step_usages_registry import step_usages_registry
+from . import indexer
+from .project_registry import projects
+from .change_detector import ChangeDetector
+from .impact import ImpactBaseline
+from .index_cache import IndexCache
+from .index_scheduler import IndexScheduler
+from .live_highlight import LiveHighlighter
+from .process_registry import running_processes, BehaveCancelledError
+from .timing import timed, timed_operation, timed_phase
 from .utils import get_project_root, \
+    get_view_root, \
+    get_cache_dir, \
     is_feature_file_in_project, \
     is_step_file_in_project, \
     get_phrase_from_line
 
+INVALID_SYNTAX_REGION_NAME = 'sb.invalid_synax'
+# Live highlighting slower than this (seconds) is no longer done on every
+# keystroke but delayed instead
+LIVE_HIGHLIGHT_BUDGET = 0.05
+
+def update_all(root, use_cache=False):
+    project = projects.get(root)
+    settings = sublime.load_settings('SublimeBehave.sublime-settings')
+    cache = None
+    if settings.get('index_cache', True):
+        cache = IndexCache(get_cache_dir(), root)
+    fingerprint = indexer.update_index(
+        root, project.step_registry, project.step_usages_registry, cache,
+        use_cache, lambda file_names: update_step_usages(root, file_names))
+    project.indexed = True
+    change_detector.set_fingerprint(root, fingerprint)
+    _ensure_impact_baseline(project)
+
+def _ensure_impact_baseline(project):
+    '''
+    Changes to step definitions are tracked since the project is indexed
+    '''
+    if project.impact_baseline is None:
+        with timed_phase('impact baseline'):
+            project.impact_baseline = ImpactBaseline(
+                project.root, project.step_registry,
+                project.step_usages_registry)
+
+def update_step_usages(root, file_names):
+    '''
+    Updates usages of given feature files in one go. A file which fails to
+    parse is marked in its view and the rest is updated without it.
+    Returns names of updated files
+    '''
+    def on_parse_error(file_name, line_no):
+        sublime.status_message('Parse error: {}:{}'.format(file_name,
+                                                          line_no))
+        for view in _find_open_views([file_name]):
+            region = get_phrase_from_line(view, line_no)
+            view.add_regions(INVALID_SYNTAX_REGION_NAME,
+                             [region], 'invalid')
+
+    try:
+        file_names = indexer.update_step_usages(
+            root, projects.get(root).step_usages_registry, file_names,
+            on_parse_error)
+    except BehaveCancelledError:
+        raise
+    except Exception as e:
+        if not indexer.PARSE_ERROR_REGEX.search(str(e)):
+            sublime.status_message(
+                'General parse error, check console log for more details')
+        raise
+    for view in _find_open_views(os.path.join(root, x) for x in file_names):
+        view.erase_regions(INVALID_SYNTAX_REGION_NAME)
+        view.run_command('sb_highlight_undefined_steps')
+    return file_names
+
+def _find_open_views(file_names):
+    for file_name in file_names:
+        for window in sublime.windows():
+            view = window.find_open_file(file_name)
+            if view is not None:
+                yield view
+
+def _run_index_job(root, job):
+    try:
+        _run_index_job_impl(root, job)
+    except BehaveCancelledError as e:
+        # Superseded, cancelled by the user or timed out. Whatever was
+        # indexed so far is kept until the next update
+        print('SublimeBehave: Index update of {} stopped, {}'.format(root, e))
+        sublime.status_message('Behave: Index update stopped, {}'.format(e))
+
+def _run_index_job_impl(root, job):
+    if job.full:
+        with timed_operation('Update index'):
+            update_all(root, job.use_cache)
+        # Index of this project may have grown past the limits
+        projects.evict()
+        for window in sublime.windows():
+            view = window.active_view()
+            if view is not None and is_feature_file_in_project(view) and \
+                    get_view_root(view) == root:
+                view.run_command('sb_highlight_undefined_steps')
+    elif len(job.files) > 0:
+        with timed_operation('Update index of {} files'.format(len(job.files))):
+            update_step_usages(root, sorted(job.files))
+        change_detector.update_files(root, job.files)
+
+def _on_files_changed(root, changed, removed):
+    '''
+    Re-indexes files changed outside of the editor
+    '''
+    print('SublimeBehave: {} files changed and {} removed outside of the '
+          'editor in {}'.format(len(changed), len(removed), root))
+    if indexer.is_incremental(root, changed, removed):
+        index_scheduler.schedule_files(root, changed + removed)
+    else:
+        index_scheduler.schedule_full(root)
+
+index_scheduler = IndexScheduler(
+    _run_index_job,
+    lambda root: running_processes.cancel(root, dry_run_only=True))
+change_detector = ChangeDetector(
+    lambda: [x.root for x in projects.get_projects() if x.indexed],
+    index_scheduler.is_busy,
+    _on_files_changed)
+
 class SbUpdateAllStepDefinitionsCommand(sublime_plugin.WindowCommand):
     def __init__(self, window):
         super(SbUpdateAllStepDefinitionsCommand, self).__init__(window)
 
-    def run(self):
-        sublime.set_timeout_async(self.run_impl, 0)
-
-    def run_impl(self):
-        root = get_project_root(self.window)
-        step_registry.update_definitions(root)
-        step_usages_registry.update_step_usages(root)
+    def run(self, use_cache=False):
+        index_scheduler.schedule_full(get_project_root(self.window), use_cache)
 
     def is_enabled(self):
         return get_project_root(self.window) is not None
 
 class SbUpdateStepUsagesCommand(sublime_plugin.TextCommand):
-    REGION_NAME = 'sb.invalid_synax'
-    ERROR_REGEX = re.compile(r'Failed to parse "(.*)":.*, at line (\d+)')
-
     def __init__(self, view):
         super(SbUpdateStepUsagesCommand, self).__init__(view)
 
     def run(self, edit):
-        sublime.set_timeout_async(self.run_impl, 0)
-
-    def run_impl(self):
-        root = get_project_root(self.view.window())
+        root = get_view_root(self.view)
         file_name = os.path.relpath(self.view.file_name(), root)
-        try:
-            step_usages_registry.update_step_usages(root, [file_name])
-            self.view.erase_regions(self.REGION_NAME)
-        except Exception as e:
-            match = self.ERROR_REGEX.search(str(e))
-            if match:
-                file_name = os.path.normpath(match.group(1))
-                line_no = int(match.group(2))
-                sublime.status_message('Parse error: {}:{}'.format(file_name, line_no))
-
-                if file_name == os.path.normpath(self.view.file_name()):
-
-                    region = get_phrase_from_line(self.view, line_no)
-                    self.view.add_regions(self.REGION_NAME,
-                                          [region], 'invalid')
-            else:
-                sublime.status_message(
-                    'General parse error, check console log for more details')
-                raise
+        index_scheduler.schedule_files(root, [file_name])
 
     def is_enabled(self):
         return is_feature_file_in_project(self.view)
@@ -70,11 +158,13 @@ class SbHighlightUndefinedStepsCommand(sublime_plugin.TextCommand):
     def run(self, edit):
         sublime.set_timeout_async(self.run_impl, 0)
 
+    @timed('Highlight undefined steps')
     def run_impl(self):
         # This requires fresh step_usages_registry
-        file_name = os.path.relpath(self.view.file_name(),
-                                    get_project_root(self.view.window()))
-        undefs = step_usages_registry.get_undefined_step_usages(file_name)
+        root = get_view_root(self.view)
+        file_name = os.path.relpath(self.view.file_name(), root)
+        undefs = projects.get(root).step_usages_registry \
+            .get_undefined_step_usages(file_name)
         regions = [get_phrase_from_line(self.view, undef[1]) for undef in undefs]
         self.view.add_regions(self.REGION_NAME, regions, 'comment')            
 
@@ -82,13 +172,80 @@ class SbHighlightUndefinedStepsCommand(sublime_plugin.TextCommand):
         return is_feature_file_in_project(self.view)
 
 class SbStepRegistryEventListener(sublime_plugin.EventListener):
+    def __init__(self):
+        super(SbStepRegistryEventListener, self).__init__()
+        # view id -> LiveHighlighter
+        self.live_highlighters = {}
+        # views with delayed live highlighting
+        self.live_pending = set()
+
     def on_activated(self, view):
         if is_feature_file_in_project(view):
+            self._ensure_indexed(view)
             view.run_command('sb_highlight_undefined_steps')
+        elif is_step_file_in_project(view):
+            self._ensure_indexed(view)
+
+    def _ensure_indexed(self, view):
+        '''
+        Indexes the view's project unless it's indexed already, i.e. another
+        folder of the window or a project evicted meanwhile
+        '''
+        root = get_view_root(view)
+        if not projects.get(root).indexed and \
+                not index_scheduler.is_busy(root):
+            index_scheduler.schedule_full(root, use_cache=True)
+
+    def on_modified_async(self, view):
+        if not is_feature_file_in_project(view):
+            return
+        settings = sublime.load_settings('SublimeBehave.sublime-settings')
+        if not settings.get('highlight_while_typing', True):
+            return
+        step_registry = projects.get(get_view_root(view)).step_registry
+        if step_registry.get_count() == 0:
+            return
+
+        highlighter = self.live_highlighters.setdefault(view.id(),
+                                                        LiveHighlighter())
+        if highlighter.duration > LIVE_HIGHLIGHT_BUDGET:
+            # Huge file, back off instead of re-highlighting on every change
+            if view.id() not in self.live_pending:
+                self.live_pending.add(view.id())
+                delay = min(int(highlighter.duration * 10000), 2000)
+                sublime.set_timeout_async(
+                    lambda: self._highlight_delayed(view), delay)
+            return
+        self._highlight_live(view, highlighter, step_registry)
+
+    def on_close(self, view):
+        self.live_highlighters.pop(view.id(), None)
+
+    def _highlight_delayed(self, view):
+        self.live_pending.discard(view.id())
+        highlighter = self.live_highlighters.get(view.id())
+        if highlighter is not None and view.is_valid():
+            step_registry = projects.get(get_view_root(view)).step_registry
+            self._highlight_live(view, highlighter, step_registry)
+
+    def _highlight_live(self, view, highlighter, step_registry):
+        '''
+        Highlights undefined steps of unsaved contents by matching them
+        in-process
+        '''
+        change_count = view.change_count()
+        lines = view.substr(sublime.Region(0, view.size())).split('\n')
+        undefined = highlighter.update(lines, step_registry.matcher)
+        if view.change_count() != change_count:
+            # Modified meanwhile, next pass will take care of it
+            return
+        regions = [get_phrase_from_line(view, x) for x in undefined]
+        view.add_regions(SbHighlightUndefinedStepsCommand.REGION_NAME,
+                         regions, 'comment')
 
     def on_post_save(self, view):
         if is_feature_file_in_project(view):
+            # Undefined steps are highlighted once usages are updated
             view.run_command('sb_update_step_usages')
-            view.run_command('sb_highlight_undefined_steps')
         elif is_step_file_in_project(view):
             view.window().run_command('sb_update_all_step_definitions')
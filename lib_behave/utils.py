@@ -1,5 +1,7 @@
-import sublime
 import os
+import subprocess
+
+from .host import is_windows, cache_path
 
 def check_selector(view, selector):
     try:
@@ -19,13 +21,45 @@ def is_python(view):
 
 def get_project_root(window):
     '''
-    Pick first folder if any
+    Pick folder of the active view, first folder otherwise (if any)
+    '''
+    view = window.active_view()
+    if view is not None:
+        return get_view_root(view, window)
+    folders = window.folders()
+    if len(folders) < 1:
+        return None
+    return folders[0]
+
+def get_view_root(view, window=None):
+    '''
+    Pick (innermost) folder containing the view's file, first folder otherwise
+    (if any). Every folder of a window is a separate behave project
     '''
+    window = window or view.window()
+    if window is None:
+        return None
     folders = window.folders()
     if len(folders) < 1:
         return None
+    file_name = view.file_name()
+    if file_name:
+        for folder in sorted(folders, key=len, reverse=True):
+            if file_name.startswith(os.path.join(folder, '')):
+                return folder
     return folders[0]
 
+def get_startupinfo():
+    if not is_windows():
+        return None
+    # Prevent Windows from opening a console when starting a process
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+def get_cache_dir():
+    return os.path.join(cache_path(), 'SublimeBehave')
+
 def is_view_in_folder(view, folder):
     if not view.file_name() or not folder:
         return False
@@ -34,7 +68,7 @@ def is_view_in_folder(view, folder):
 def is_feature_file_in_project(view):
     if not is_gherkin(view):
         return False
-    folder = get_project_root(view.window())
+    folder = get_view_root(view)
     if folder is None:
         return False
     return is_view_in_folder(view, os.path.join(folder, 'features'))
@@ -42,7 +76,7 @@ def is_feature_file_in_project(view):
 def is_step_file_in_project(view):
     if not is_python(view):
         return False
-    folder = get_project_root(view.window())
+    folder = get_view_root(view)
     if folder is None:
         return False
     return is_view_in_folder(view, os.path.join(folder, 'features', 'steps'))
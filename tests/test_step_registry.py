@@ -0,0 +1,65 @@
+'''
+Definitions published while behave's output is being parsed must be
+complete, they are never modified after
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib_behave.behave_command import BehaveCommand
+from lib_behave.step_registry import StepRegistry
+
+STEP_MODULE = '''from behave import given, when, use_step_matcher
+use_step_matcher('re')
+
+@given(r'a (\\d+) item')
+def step_impl(context, n):
+    pass
+
+@when(r'I go')
+def step_impl(context):
+    pass
+'''
+
+# Output of behave's 'steps' formatter for the module above
+STEPS_OUTPUT = [
+    'GIVEN STEP DEFINITIONS[1]:',
+    '  Given a (\\d+) item  # features/steps/s.py:4',
+    '',
+    'WHEN STEP DEFINITIONS[1]:',
+    '  When I go          # features/steps/s.py:8',
+    '',
+]
+
+class UpdateDefinitionsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        steps_dir = os.path.join(self.directory, 'features', 'steps')
+        os.makedirs(steps_dir)
+        with open(os.path.join(steps_dir, 's.py'), 'w') as f:
+            f.write(STEP_MODULE)
+
+    def test_published_definitions_have_their_matchers(self):
+        registry = StepRegistry()
+        seen = []
+
+        def run_lines(command, directory, *args, **kwargs):
+            for line in STEPS_OUTPUT:
+                seen.extend((x.phrase, x.matcher) for x in registry)
+                yield line
+
+        with mock.patch.object(BehaveCommand, 'run_lines', run_lines):
+            registry._update_definitions(self.directory)
+        self.assertIn(('Given a (\\d+) item', 're'), seen)
+        self.assertEqual(set(x[1] for x in seen), set(['re']))
+        self.assertEqual([(x.phrase, x.matcher) for x in registry],
+                         [('Given a (\\d+) item', 're'), ('When I go', 're')])
+
+if __name__ == '__main__':
+    unittest.main()
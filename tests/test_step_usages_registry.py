@@ -0,0 +1,110 @@
+'''
+Index of step usages must never be published empty (or partial) while
+an update is running
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib_behave import step_usages_registry
+from lib_behave.behave_command import BehaveCommand
+from lib_behave.step_registry import StepRegistry, StepDefinition
+from lib_behave.step_usages_registry import StepUsagesRegistry, StepUsage
+
+# Output of behave's 'steps.usage' formatter for features/a.feature
+USAGE_OUTPUT = [
+    "@given('a {n} item')         # features/steps/s.py:4",
+    "  Given a 5 item             # features/a.feature:3",
+    "",
+    "UNDEFINED STEPS[1]:",
+    "  Given nothing              # features/a.feature:4",
+    "",
+]
+
+def make_usages(file_name):
+    return [StepUsage(file_name, 3, 'features/steps/s.py', 4)]
+
+class UpdateStepUsagesTest(unittest.TestCase):
+    def setUp(self):
+        # Publish partial results after every section
+        patcher = mock.patch.object(step_usages_registry, 'PUBLISH_INTERVAL',
+                                    -1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = StepUsagesRegistry(StepRegistry())
+        self.registry._replace_step_usages(
+            {x: make_usages(x) for x in ('features/a.feature',
+                                         'features/b.feature')},
+            [], full=True)
+
+    def run_update(self, feature_files):
+        '''
+        Runs update with fake behave, returns numbers of indexed files seen
+        before every line of its output
+        '''
+        registry = self.registry
+        seen = []
+
+        def run_lines(command, directory, *args, **kwargs):
+            for line in USAGE_OUTPUT:
+                seen.append(len(registry.step_usages))
+                yield line
+
+        with mock.patch.object(BehaveCommand, 'run_lines', run_lines):
+            registry._update_step_usages('/project', feature_files)
+        return seen
+
+    def test_indexed_files_stay_published_while_updating_one(self):
+        seen = self.run_update(['features/a.feature'])
+        self.assertEqual(seen, [2] * len(USAGE_OUTPUT))
+        self.assertEqual(sorted(self.registry.step_usages),
+                         ['features/a.feature', 'features/b.feature'])
+        self.assertEqual(
+            [(x.line, x.def_line)
+             for x in self.registry.step_usages['features/a.feature']],
+            [(3, 4), (4, -1)])
+
+    def test_indexed_files_stay_published_while_updating_all(self):
+        seen = self.run_update([])
+        self.assertNotIn(0, seen)
+        # Files missing from the output of a full update are gone
+        self.assertEqual(sorted(self.registry.step_usages),
+                         ['features/a.feature'])
+
+class UpdateStepUsagesNativeTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(step_usages_registry, 'PUBLISH_INTERVAL',
+                                    -1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.makedirs(os.path.join(self.directory, 'features'))
+        for name in ('a', 'b'):
+            with open(os.path.join(self.directory, 'features',
+                                   name + '.feature'), 'w') as f:
+                f.write('Feature: {}\n  Scenario: s\n    Given a 5 item\n'
+                        .format(name))
+        step_registry = StepRegistry()
+        step_registry._publish({'given': [StepDefinition(
+            'given', 'Given a {n} item', 'features/steps/s.py', 4)]})
+        self.registry = StepUsagesRegistry(step_registry)
+
+    def test_last_file_published_on_its_own_keeps_index(self):
+        self.registry._update_step_usages_native(
+            self.directory, [], self.registry.step_registry)
+        files = [os.path.join('features', x)
+                 for x in ('a.feature', 'b.feature')]
+        self.assertEqual(sorted(self.registry.step_usages), files)
+        self.assertEqual(
+            [(x.line, x.def_file_name, x.def_line)
+             for x in self.registry.step_usages[files[1]]],
+            [(3, 'features/steps/s.py', 4)])
+
+if __name__ == '__main__':
+    unittest.main()